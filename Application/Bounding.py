@@ -0,0 +1,261 @@
+import numpy as np
+
+import Trace
+
+# Offset between the angles of two hulls when the calipers of many hulls are searched at once,
+# more than the 2 pi turn of a hull so the angles of every hull stay in their own interval
+HULL_ANGLE_OFFSET = 8 * np.pi
+
+
+# Flattens point sets into their finite points (P, 2) and the index (P,) of the set of each
+def flatten(point_sets):
+    sets = [np.asarray(points, dtype=float).reshape(-1, 2) for points in point_sets]
+    points = np.concatenate(sets + [np.empty((0, 2))])
+    sets_of_points = np.repeat(np.arange(len(sets)), [len(points) for points in sets])
+
+    is_finite = np.isfinite(points).all(axis=1)
+    return points[is_finite], sets_of_points[is_finite]
+
+
+# Cross products (N,) of b - a and p - a, positive when p is on the left of a -> b
+def cross(a, b, p):
+    return (b[:, 0] - a[:, 0])*(p[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1])*(p[:, 0] - a[:, 0])
+
+
+# Points (e.g. the polylines and ticks) of a draw list as one array (N, 2)
+def get_draw_list_points(draw_list):
+    return np.concatenate(draw_list.curves + [draw_list.ticks.reshape(-1, 2), np.empty((0, 2))])
+
+
+# Indices of the points of every set with the smallest coordinate x (direction 1) or the largest
+# (direction -1), the smallest or largest y on ties, the sets being contiguous from their bounds
+def get_extremes(points, sets, present, bounds, direction):
+    x, y = direction*points[:, 0], direction*points[:, 1]
+    is_extreme = x == np.minimum.reduceat(x, bounds)[np.searchsorted(present, sets)]
+    y = np.where(is_extreme, y, np.inf)
+    is_extreme &= y == np.minimum.reduceat(y, bounds)[np.searchsorted(present, sets)]
+
+    # The first of duplicated extremes
+    extremes = np.flatnonzero(is_extreme)
+    return extremes[np.unique(sets[extremes], return_index=True)[1]]
+
+
+# Convex hulls of many point sets at once, as counter-clockwise vertices (H, 2) without the
+# collinear points, up to rounding (one or two vertices for a degenerate set, none for an empty one)
+# This is a quickhull where every pending edge of every set is split in the same NumPy operations,
+# so there is one Python iteration per level of the recursion instead of one per point
+@Trace.traced("convex_hulls")
+def convex_hulls(point_sets):
+    points, sets = flatten(point_sets)
+
+    # Leftmost and rightmost points of every set (lowest and highest on ties), the points of a set
+    # being contiguous
+    present, bounds = np.unique(sets, return_index=True)
+    left = get_extremes(points, sets, present, bounds, 1)
+    right = get_extremes(points, sets, present, bounds, -1)
+
+    # Hull edges, the points outside of an edge (on its right) pending on it: the line between the
+    # extremes splits every set into the points below it, pending on left -> right, and above it
+    starts = np.concatenate((left, right))
+    ends = np.concatenate((right, left))
+
+    edge_of_set = np.full(len(point_sets), -1)
+    edge_of_set[present] = np.arange(len(present))
+    edges = edge_of_set[sets]
+    side = cross(points[left[edges]], points[right[edges]], points)
+    edges = np.where(side < 0, edges, np.where(side > 0, edges + len(present), -1))
+
+    pending = np.flatnonzero(edges >= 0)
+    edges = edges[pending]
+
+    vertices = [left, right]
+    while len(pending):
+        a, b, p = points[starts[edges]], points[ends[edges]], points[pending]
+
+        # Farthest point outside of every edge, a vertex of the hull
+        distances = -cross(a, b, p)
+        farthest_distances = np.zeros(len(starts))
+        np.maximum.at(farthest_distances, edges, distances)
+        is_farthest = distances == farthest_distances[edges]
+
+        # Of the farthest points tied on a line parallel to the edge, the last one along it, as the
+        # ones before are then on the new edge from the start, instead of around a collinear vertex
+        along = np.where(is_farthest, ((b - a)*(p - a)).sum(axis=1), -np.inf)
+        farthest_along = np.full(len(starts), -np.inf)
+        np.maximum.at(farthest_along, edges, along)
+        is_farthest &= along == farthest_along[edges]
+
+        farthest_of_edges = np.full(len(starts), -1)
+        farthest_of_edges[edges[is_farthest]] = pending[is_farthest]
+
+        split = np.flatnonzero(farthest_of_edges >= 0)
+        farthest = farthest_of_edges[split]
+        vertices.append(farthest)
+
+        # Every split edge becomes two edges through its farthest point, the points inside both are done
+        new_edges = np.full(len(starts), -1)
+        new_edges[split] = np.arange(len(split))
+        first = new_edges[edges]
+        f = points[farthest[first]]
+
+        edges = np.where(cross(a, f, p) < 0, first, np.where(cross(f, b, p) < 0, first + len(split), -1))
+        starts = np.concatenate((starts[split], farthest))
+        ends = np.concatenate((farthest, ends[split]))
+
+        is_pending = edges >= 0
+        pending, edges = pending[is_pending], edges[is_pending]
+
+    # Sort the vertices of every hull around their mean, which is inside the hull
+    vertices = np.unique(np.concatenate(vertices))
+    vertex_sets = sets[vertices]
+    counts = np.bincount(vertex_sets, minlength=len(point_sets))
+    centers = np.stack([np.bincount(vertex_sets, points[vertices, i], len(point_sets)) for i in (0, 1)], axis=1)
+    centers /= np.maximum(counts, 1)[:, None]
+
+    relative = points[vertices] - centers[vertex_sets]
+    order = np.lexsort((np.arctan2(relative[:, 1], relative[:, 0]), vertex_sets))
+
+    return np.split(points[vertices[order]], np.cumsum(counts)[:-1])
+
+
+def convex_hull(points):
+    return convex_hulls([points])[0]
+
+
+# Extents of many convex hulls in the frame of every one of their edges, the rotating calipers
+# of all the edges of all the hulls found at once: the vertices touching the calipers are binary
+# searched in the angles of the edges, which always increase around a convex hull
+class Calipers():
+    def __init__(self, hulls):
+        # Hulls with at least two vertices, to have an edge direction
+        hulls = [np.asarray(hull, dtype=float).reshape(-1, 2) for hull in hulls]
+        counts = np.array([len(hull) if len(hull) > 1 else 0 for hull in hulls], dtype=int)
+        vertices = np.concatenate([hull for hull, count in zip(hulls, counts) if count] + [np.empty((0, 2))])
+
+        # Edges from every vertex to the next one around its hull
+        self.hulls = np.repeat(np.arange(len(hulls)), counts)
+        first = (np.cumsum(counts) - counts)[self.hulls]
+        index = np.arange(len(vertices))
+        following = first + (index - first + 1) % counts[self.hulls]
+        previous = first + (index - first - 1) % counts[self.hulls]
+        edges = vertices[following] - vertices
+
+        # Angles of the edges from the first one of their hull, turning by at most pi at every
+        # vertex (never negative, even if rounding makes nearly collinear vertices slightly concave,
+        # and pi rather than -pi at both ends of a segment)
+        before = edges[previous]
+        turns = np.arctan2(before[:, 0]*edges[:, 1] - before[:, 1]*edges[:, 0], (before*edges).sum(axis=1))
+        turns = np.where(turns < -np.pi/2, turns + 2*np.pi, np.maximum(turns, 0))
+        turns = np.where(index == first, 0, turns)
+        turned = np.cumsum(turns)
+        turned -= turned[first]
+
+        self.angles = np.arctan2(edges[first, 1], edges[first, 0]) + turned
+        self.directions = np.stack((np.cos(self.angles), np.sin(self.angles)), axis=1)
+        self.normals = np.stack((-self.directions[:, 1], self.directions[:, 0]), axis=1)
+
+        # The vertex furthest along the direction at angle a from the outward normal of the first
+        # edge of a hull is the start of the first edge whose outward normal turned past a
+        keys = self.hulls * HULL_ANGLE_OFFSET + turned
+
+        def get_support(offset):
+            queries = self.hulls * HULL_ANGLE_OFFSET + np.mod(turned + offset, 2*np.pi)
+            found = np.searchsorted(keys, queries, side="left")
+            return vertices[first + (found - first) % counts[self.hulls]]
+
+        # Bounds along the edge, from the vertices touching the calipers parallel to its normal, and
+        # along its inward normal (the hull is on the left of its counter-clockwise edges) from the
+        # edge to the vertex touching the opposite caliper
+        self.u_min = (get_support(3*np.pi/2) * self.directions).sum(axis=1)
+        self.u_max = (get_support(np.pi/2) * self.directions).sum(axis=1)
+        self.v_min = (vertices * self.normals).sum(axis=1)
+        self.v_max = (get_support(np.pi) * self.normals).sum(axis=1)
+
+        self.count = len(hulls)
+
+    # Index of the edge with the smallest value of every hull, -1 for the hulls without an edge
+    def get_best(self, values):
+        best = np.full(self.count, -1)
+        order = np.lexsort((values, self.hulls))
+        heads = np.flatnonzero(np.r_[True, self.hulls[order][1:] != self.hulls[order][:-1]]) if len(order) else order
+        best[self.hulls[order[heads]]] = order[heads]
+
+        return best
+
+    # Corners (K, 4, 2) of the rectangles bounding the hull in the frame of the edges
+    def get_corners(self, edges):
+        u_min, u_max, v_min, v_max = self.u_min[edges], self.u_max[edges], self.v_min[edges], self.v_max[edges]
+        u, v = self.directions[edges], self.normals[edges]
+
+        us = np.stack((u_min, u_max, u_max, u_min), axis=1)
+        vs = np.stack((v_min, v_min, v_max, v_max), axis=1)
+        return us[..., None]*u[:, None] + vs[..., None]*v[:, None]
+
+
+# Minimum area bounding rectangles of many hulls, as their corners (C, 4, 2), the angles (C,) of
+# their sides and their areas (C,), NaN for the hulls without an edge
+def min_area_rectangles(hulls):
+    calipers = Calipers(hulls)
+    areas = (calipers.u_max - calipers.u_min) * (calipers.v_max - calipers.v_min)
+    best = calipers.get_best(areas)
+
+    is_found = best >= 0
+    corners = np.full((len(hulls), 4, 2), np.nan)
+    angles = np.full(len(hulls), np.nan)
+    rectangle_areas = np.full(len(hulls), np.nan)
+
+    corners[is_found] = calipers.get_corners(best[is_found])
+    angles[is_found] = calipers.angles[best[is_found]]
+    rectangle_areas[is_found] = areas[best[is_found]]
+
+    return corners, angles, rectangle_areas
+
+
+# Transformation matrices (C, 3, 3) fitting every hull as large as possible in the page, with a
+# margin: a rotation aligning a hull edge with a side of the page, then a uniform scale and a
+# translation centering it (the hulls without an edge are only centered)
+# The rotations are tried for every edge, along the width or the height of the page
+# A segment (a hull of collinear points) is only fitted by its length
+def fit_matrices(hulls, page=(800, 600), margin=20, tolerance=1e-9):
+    calipers = Calipers(hulls)
+    width, height = page[0] - 2*margin, page[1] - 2*margin
+
+    # Edge along the width (x from u, y from v) or along the height (x from -v, y from u), the
+    # sizes within rounding of the extent of the hull being none, e.g. across a segment
+    u_size, v_size = calipers.u_max - calipers.u_min, calipers.v_max - calipers.v_min
+    extent = tolerance * np.maximum(u_size, v_size)
+    u_size = np.where(u_size <= extent, 0, u_size)
+    v_size = np.where(v_size <= extent, 0, v_size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        along_width = np.minimum(width / u_size, height / v_size)
+        along_height = np.minimum(width / v_size, height / u_size)
+    is_along_height = along_height > along_width
+
+    scales = np.where(is_along_height, along_height, along_width)
+    best = calipers.get_best(-np.where(np.isfinite(scales), scales, 0))
+
+    matrices = np.tile(np.identity(3), (len(hulls), 1, 1))
+
+    # Hulls without an edge (a point or nothing) are only centered
+    for hull in np.flatnonzero(best < 0).tolist():
+        points = np.asarray(hulls[hull], dtype=float).reshape(-1, 2)
+        if len(points):
+            matrices[hull, 2, :2] = np.array(page) / 2 - points[0]
+
+    hull, edge = np.flatnonzero(best >= 0), best[best >= 0]
+    u, v = calipers.directions[edge], calipers.normals[edge]
+
+    # Rotated a quarter turn further, the normal is along x and the edge along y
+    turn = is_along_height[edge][:, None]
+    x_axis, y_axis = np.where(turn, -v, u), np.where(turn, u, v)
+    u_center = (calipers.u_min + calipers.u_max)[edge] / 2
+    v_center = (calipers.v_min + calipers.v_max)[edge] / 2
+    x_center, y_center = np.where(turn[:, 0], -v_center, u_center), np.where(turn[:, 0], u_center, v_center)
+
+    scale = np.where(np.isfinite(scales[edge]), scales[edge], 1)
+    matrices[hull, :2, 0] = scale[:, None] * x_axis
+    matrices[hull, :2, 1] = scale[:, None] * y_axis
+    matrices[hull, 2, 0] = page[0] / 2 - scale * x_center
+    matrices[hull, 2, 1] = page[1] / 2 - scale * y_center
+
+    return matrices
@@ -0,0 +1,244 @@
+import numpy as np
+
+import Labels
+
+# Number of elements formatted at once, so large scales are written in bounded chunks
+CHUNK_SIZE = 4096
+
+# Escapes a text for XML, without importing xml.sax (and urllib with it) at startup
+def escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+# Widths of the Helvetica glyphs (per 1000 units of font size) used to center the labels
+HELVETICA_WIDTHS = {".": 278, ",": 278, "-": 333, "+": 584, " ": 278, "e": 556}
+
+
+# Width of a label written in Helvetica/Arial at a font size
+def text_width(text, font_size):
+    return font_size * sum(HELVETICA_WIDTHS.get(char, 556) for char in text) / 1000
+
+
+# Writes the elements of a nomograph to a file as they come, only keeping their bounds
+# The subclasses write the actual format
+class Writer():
+    def __init__(self, path, font_size=8, line_width=1, margin=20):
+        self.file = open(path, "wb")
+        self.font_size = font_size
+        self.line_width = line_width
+        self.margin = margin
+
+        self.bounds = [np.inf, np.inf, -np.inf, -np.inf]
+
+        # The labels are placed across all the scales, so they never overlap
+        self.label_placer = Labels.LabelPlacer(Labels.FontMetrics(lambda text: text_width(text, font_size), 1.2*font_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_text(self, text):
+        self.file.write(text.encode("utf-8"))
+
+    def update_bounds(self, points):
+        if len(points) == 0:
+            return
+
+        self.bounds[0] = min(self.bounds[0], points[:, 0].min())
+        self.bounds[1] = min(self.bounds[1], points[:, 1].min())
+        self.bounds[2] = max(self.bounds[2], points[:, 0].max())
+        self.bounds[3] = max(self.bounds[3], points[:, 1].max())
+
+    # Bounds of everything written, with the margin around it
+    def get_bounds(self):
+        if self.bounds[0] > self.bounds[2]:
+            return 0, 0, 0, 0
+
+        x_min, y_min, x_max, y_max = self.bounds
+        return x_min - self.margin, y_min - self.margin, x_max + self.margin, y_max + self.margin
+
+    # Writes the curves, ticks and labels of a ScaleGeometry
+    def write_scale(self, scale):
+        for curve in scale.curves:
+            self.update_bounds(curve)
+            self.polyline(curve)
+
+        for start in range(0, len(scale.ticks), CHUNK_SIZE):
+            ticks = scale.ticks[start:start + CHUNK_SIZE]
+            self.update_bounds(ticks.reshape(-1, 2))
+            self.segments(ticks)
+
+        for start in range(0, len(scale.labels), CHUNK_SIZE):
+            labels, keep = self.label_placer.place(
+                scale.labels[start:start + CHUNK_SIZE], scale.texts[start:start + CHUNK_SIZE],
+                scale.label_normals[start:start + CHUNK_SIZE]
+            )
+            texts = [text for text, is_kept in zip(scale.texts[start:start + CHUNK_SIZE], keep) if is_kept]
+            self.update_bounds(labels[keep])
+            self.labels(labels[keep], texts)
+
+    def polyline(self, points):
+        raise NotImplementedError
+
+    def segments(self, segments):
+        raise NotImplementedError
+
+    def labels(self, positions, texts):
+        raise NotImplementedError
+
+    def close(self):
+        self.file.close()
+
+
+# Number of the view box, in at most 16 characters whatever its value, e.g. 1e11 near a pole
+# The values past +-1e300 (up to the infinite ones) are clamped so their width stays finite
+def format_extent(value):
+    value = float(np.clip(np.nan_to_num(value), -1e300, 1e300))
+    if abs(value) < 1e12:
+        return f"{value:.2f}"
+    return f"{value:.6e}"
+
+
+# SVG in the canvas coordinates, the view box is filled in once everything is written, in the
+# space reserved for it ahead of the elements
+class SvgWriter(Writer):
+    VIEW_BOX_SIZE = 160
+
+    def __init__(self, path, color="black", **kwargs):
+        super().__init__(path, **kwargs)
+
+        self.write_text('<?xml version="1.0" encoding="UTF-8"?>\n<svg xmlns="http://www.w3.org/2000/svg" ')
+        self.view_box_offset = self.file.tell()
+        self.write_text(" " * SvgWriter.VIEW_BOX_SIZE + ">\n")
+
+        self.write_text(f'<g fill="none" stroke="{color}" stroke-width="{self.line_width}" stroke-linecap="round">\n')
+        self.text_style = (
+            f'font-family="Helvetica, Arial" font-size="{self.font_size}" fill="{color}" stroke="none" '
+            'text-anchor="middle" dominant-baseline="central"'
+        )
+
+    def polyline(self, points):
+        coords = " ".join(f"{x:.2f},{y:.2f}" for x, y in points.tolist())
+        self.write_text(f'<polyline points="{coords}"/>\n')
+
+    def segments(self, segments):
+        path = "".join(f"M{x1:.2f} {y1:.2f}L{x2:.2f} {y2:.2f}" for x1, y1, x2, y2 in segments.reshape(-1, 4).tolist())
+        self.write_text(f'<path d="{path}"/>\n')
+
+    def labels(self, positions, texts):
+        self.write_text(f"<g {self.text_style}>\n")
+        for (x, y), text in zip(positions.tolist(), texts):
+            self.write_text(f'<text x="{x:.2f}" y="{y:.2f}">{escape(text)}</text>\n')
+        self.write_text("</g>\n")
+
+    def close(self):
+        self.write_text("</g>\n</svg>\n")
+
+        x_min, y_min, x_max, y_max = [format_extent(value) for value in self.get_bounds()]
+        width = format_extent(float(x_max) - float(x_min))
+        height = format_extent(float(y_max) - float(y_min))
+        view_box = f'width="{width}" height="{height}" viewBox="{x_min} {y_min} {width} {height}"'
+
+        # At most 31 + 6*16 characters, never overwriting the first elements after the reserved space
+        self.file.seek(self.view_box_offset)
+        self.write_text(view_box.ljust(SvgWriter.VIEW_BOX_SIZE))
+
+        super().close()
+
+
+# Single page PDF, the content stream is written as the elements come and the page,
+# sized to the bounds, is only written after it
+class PdfWriter(Writer):
+    def __init__(self, path, scale=0.75, **kwargs):
+        super().__init__(path, **kwargs)
+
+        # Canvas pixels to points, y going down like on the canvas
+        self.scale = scale
+        self.offsets = {}
+
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.begin_object(5)
+        self.write_text("<< /Length 6 0 R >>\nstream\n")
+        self.stream_start = self.file.tell()
+        self.write_text(f"{scale:g} 0 0 {-scale:g} 0 0 cm\n{self.line_width:g} w 1 J 0 0 0 RG 0 0 0 rg\n")
+
+    def begin_object(self, number):
+        self.offsets[number] = self.file.tell()
+        self.write_text(f"{number} 0 obj\n")
+
+    def polyline(self, points):
+        coords = [f"{x:.2f} {y:.2f} l" for x, y in points[1:].tolist()]
+        self.write_text(f"{points[0, 0]:.2f} {points[0, 1]:.2f} m\n" + "\n".join(coords) + "\nS\n")
+
+    def segments(self, segments):
+        self.write_text("".join(
+            f"{x1:.2f} {y1:.2f} m {x2:.2f} {y2:.2f} l\n" for x1, y1, x2, y2 in segments.reshape(-1, 4).tolist()
+        ) + "S\n")
+
+    def labels(self, positions, texts):
+        size = self.font_size
+        lines = [f"BT /F1 {size:g} Tf"]
+        for (x, y), text in zip(positions.tolist(), texts):
+            # Flip the text back up and center it on its position
+            escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            lines.append(f"1 0 0 -1 {x - text_width(text, size) / 2:.2f} {y + 0.35 * size:.2f} Tm ({escaped}) Tj")
+        lines.append("ET\n")
+        self.write_text("\n".join(lines))
+
+    def close(self):
+        length = self.file.tell() - self.stream_start
+        self.write_text("endstream\nendobj\n")
+
+        self.begin_object(6)
+        self.write_text(f"{length}\nendobj\n")
+
+        x_min, y_min, x_max, y_max = [value * self.scale for value in self.get_bounds()]
+        objects = {
+            1: "<< /Type /Catalog /Pages 2 0 R >>",
+            2: "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            3: f"<< /Type /Page /Parent 2 0 R /MediaBox [{x_min:.2f} {-y_max:.2f} {x_max:.2f} {-y_min:.2f}] "
+               "/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+            4: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+        }
+        for number, content in objects.items():
+            self.begin_object(number)
+            self.write_text(f"{content}\nendobj\n")
+
+        xref = self.file.tell()
+        self.write_text(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n")
+        for number in range(1, len(self.offsets) + 1):
+            self.write_text(f"{self.offsets[number]:010d} 00000 n \n")
+        self.write_text(f"trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+
+        super().close()
+
+
+WRITERS = {
+    ".svg": SvgWriter,
+    ".pdf": PdfWriter
+}
+
+
+# Gets the writer of a path from its extension
+def get_writer(path, **kwargs):
+    for extension, writer in WRITERS.items():
+        if path.lower().endswith(extension):
+            return writer(path, **kwargs)
+
+    raise ValueError(f"Unsupported output format: {path}")
+
+
+# Streams a nomograph to a file, computing and writing its scales one at a time
+def export(nomograph, path, tick_size=5, variables=None, **kwargs):
+    with get_writer(path, **kwargs) as writer:
+        for scale in nomograph.iter_scale_geometry(tick_size, variables, cache=False):
+            writer.write_scale(scale)
+
+
+# Writes an already computed draw list to a file
+def write(draw_list, path, **kwargs):
+    with get_writer(path, **kwargs) as writer:
+        for scale in draw_list.scales:
+            writer.write_scale(scale)
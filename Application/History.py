@@ -0,0 +1,154 @@
+import numpy as np
+
+# Steps between two checkpoints, restoring any position composes at most this many matrices
+CHECKPOINT_INTERVAL = 16
+# Steps kept, the oldest quarter is dropped past a quarter more
+MAX_STEPS = 1 << 16
+
+
+# Renormalizes a composed transformation against float drift: the homogeneous scale is brought
+# back to 1 and a linear part that is a rotation times a uniform scale within tolerance (e.g. after
+# thousands of rotations and zooms) is snapped back to exactly one
+# Shears, non-uniform scales and perspectives are kept as they are
+def renormalize(matrix, tolerance=1e-9):
+    matrix = np.array(matrix, dtype=float)
+    if not np.isfinite(matrix).all() or matrix[2, 2] == 0:
+        return matrix
+
+    matrix /= abs(matrix[2, 2])
+
+    u, s, vt = np.linalg.svd(matrix[:2, :2])
+    if s[0] > 0 and s[0] - s[1] <= tolerance * s[0]:
+        matrix[:2, :2] = s.mean() * (u @ vt)
+
+    return matrix
+
+
+# Undo/redo log of the committed transformations of a nomograph, as float 3x3 matrices
+# Every step is either relative (composed after the current transformation) or absolute (it
+# replaces it, e.g. a reset), and the composed transformation is kept every CHECKPOINT_INTERVAL
+# steps, so undoing or jumping to any position composes a bounded number of matrices and
+# redoing composes a single one
+class TransformHistory():
+    def __init__(self, checkpoint_interval=CHECKPOINT_INTERVAL, max_steps=MAX_STEPS):
+        self.checkpoint_interval = checkpoint_interval
+        self.max_steps = max(max_steps, checkpoint_interval)
+
+        # Steps (N, 3, 3), whether each is absolute, and the composed transformations every interval
+        # (N // interval + 1, 3, 3), allocated ahead and grown by doubling
+        self.steps = np.empty((checkpoint_interval, 3, 3))
+        self.is_absolute = np.zeros(checkpoint_interval, dtype=bool)
+        self.checkpoints = np.empty((2, 3, 3))
+        self.checkpoints[0] = np.identity(3)
+
+        # Number of steps in the log and of the ones applied
+        self.count = 0
+        self.position = 0
+
+        self.matrix = np.identity(3)
+
+    def copy(self):
+        other = TransformHistory(self.checkpoint_interval, self.max_steps)
+        other.steps = self.steps.copy()
+        other.is_absolute = self.is_absolute.copy()
+        other.checkpoints = self.checkpoints.copy()
+        other.count = self.count
+        other.position = self.position
+        other.matrix = self.matrix.copy()
+
+        return other
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < self.count
+
+    # Applies a step, dropping the undone ones after it, and returns the new transformation
+    def push(self, matrix, is_absolute=False):
+        matrix = np.asarray(matrix, dtype=float)
+        self.count = self.position
+
+        if self.count == len(self.steps):
+            self.steps = np.concatenate((self.steps, np.empty_like(self.steps)))
+            self.is_absolute = np.concatenate((self.is_absolute, np.zeros_like(self.is_absolute)))
+            self.checkpoints = np.concatenate((self.checkpoints, np.empty((len(self.checkpoints) - 1, 3, 3))))
+
+        self.steps[self.count] = matrix
+        self.is_absolute[self.count] = is_absolute
+        self.count += 1
+        self.position = self.count
+
+        self.matrix = matrix.copy() if is_absolute else self.matrix @ matrix
+        self.add_checkpoint()
+
+        if self.count > self.max_steps + self.max_steps // 4:
+            self.drop_oldest(self.count - self.max_steps)
+
+        return self.matrix
+
+    # Stores (or replaces) the checkpoint at the current position if it is on one, renormalized
+    def add_checkpoint(self):
+        index, offset = divmod(self.position, self.checkpoint_interval)
+        if offset:
+            return
+
+        self.matrix = renormalize(self.matrix)
+        self.checkpoints[index] = self.matrix
+
+    # Forgets about the first count steps (rounded down to checkpoints), the next checkpoint becoming the start
+    def drop_oldest(self, count):
+        checkpoints = count // self.checkpoint_interval
+        count = checkpoints * self.checkpoint_interval
+
+        self.steps[:self.count - count] = self.steps[count:self.count]
+        self.is_absolute[:self.count - count] = self.is_absolute[count:self.count]
+        kept = self.count // self.checkpoint_interval + 1 - checkpoints
+        self.checkpoints[:kept] = self.checkpoints[checkpoints:checkpoints + kept]
+
+        self.count -= count
+        self.position -= count
+
+    # Composed transformation after the first position steps, from the checkpoint before it
+    def get_matrix(self, position):
+        index = position // self.checkpoint_interval
+        start = index * self.checkpoint_interval
+
+        # Nothing before the last absolute step matters
+        absolute = np.flatnonzero(self.is_absolute[start:position])
+        if len(absolute):
+            start += absolute[-1]
+            matrix = np.identity(3)
+        else:
+            matrix = self.checkpoints[index].copy()
+
+        for step in self.steps[start:position]:
+            matrix = matrix @ step
+
+        return matrix
+
+    # Moves to any position of the log and returns its transformation
+    def seek(self, position):
+        self.position = min(max(position, 0), self.count)
+        self.matrix = self.get_matrix(self.position)
+
+        return self.matrix
+
+    # Both return the transformation, None if there is nothing to undo or redo
+    def undo(self):
+        if not self.can_undo():
+            return None
+        return self.seek(self.position - 1)
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+
+        # The checkpoints after the position are still those of the steps being redone
+        step = self.steps[self.position]
+        self.matrix = step.copy() if self.is_absolute[self.position] else self.matrix @ step
+        self.position += 1
+        if self.position % self.checkpoint_interval == 0:
+            self.matrix = self.checkpoints[self.position // self.checkpoint_interval].copy()
+
+        return self.matrix
@@ -0,0 +1,185 @@
+import builtins
+import contextlib
+import hashlib
+import inspect
+import os
+import sys
+import tempfile
+import types
+
+import numpy as np
+
+import Trace
+
+# Persistent cache of the generated NumPy source of the kernels, so reopening a chart does not
+# differentiate and lambdify its rows again. Entries are content addressed by a hash of the
+# expressions they compute, and the least recently used ones are evicted past max_bytes.
+# NOMOGRAPH_CACHE_DIR overrides the location, set to an empty string it disables the cache.
+VERSION = 1
+MAX_BYTES = 64 * 1024 * 1024
+
+
+# Per user cache directory of the platform
+def get_user_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser(os.path.join("~", "AppData", "Local")))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+
+    return os.path.join(base, "Nomographer", "kernels")
+
+
+# Hash of the canonical text of what a kernel computes, e.g. the srepr of the expressions of its rows
+def get_key(text):
+    return hashlib.sha256(f"{VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+
+# Global names used by a code object and the code objects nested in it
+def get_global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= get_global_names(const)
+
+    return names
+
+
+# Source of a module defining a generated function as kernel: the numpy names it uses (under the
+# name the printer gave them, e.g. acos for arccos) then the function, None if it uses anything else
+def get_module_source(func):
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        return None
+
+    numpy_names = {id(value): name for name, value in vars(np).items() if not name.startswith("_")}
+
+    lines = []
+    for name in sorted(get_global_names(func.__code__)):
+        value = func.__globals__.get(name)
+        if value is None:
+            if hasattr(builtins, name):
+                continue
+            return None
+
+        if isinstance(value, (bool, int, float, complex)):
+            lines.append(f"{name} = {value!r}")
+        elif getattr(np, name, None) is value or id(value) in numpy_names:
+            attribute = name if getattr(np, name, None) is value else numpy_names[id(value)]
+            lines.append(f"from numpy import {attribute}" + ("" if attribute == name else f" as {name}"))
+        else:
+            return None
+
+    return "\n".join(lines + ["", "", source, f"kernel = {func.__name__}", ""])
+
+
+class KernelCache():
+    def __init__(self, path=None, max_bytes=MAX_BYTES):
+        self.path = get_user_cache_dir() if path is None else path
+        self.max_bytes = max_bytes
+
+    def get_path(self, key):
+        return os.path.join(self.path, key + ".py")
+
+    # Gets the function defined by the cached source of key, None if it is not cached
+    def load(self, key):
+        if not self.path:
+            return None
+
+        path = self.get_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                source = file.read()
+
+            namespace = {}
+            exec(compile(source, path, "exec"), namespace)
+            func = namespace["kernel"]
+        except FileNotFoundError:
+            Trace.count("kernel_cache_misses")
+            return None
+        except Exception:
+            # Corrupted or from an incompatible version, compiled again and replaced
+            Trace.count("kernel_cache_misses")
+            self.remove(path)
+            return None
+
+        # Most recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        Trace.count("kernel_cache_hits")
+        return func
+
+    # Stores the source of a generated function, silently doing nothing if the cache is not writable
+    def store(self, key, func):
+        if not self.path:
+            return
+
+        module_source = get_module_source(func)
+        if module_source is None:
+            return
+
+        path = self.get_path(key)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+
+            # Written aside then renamed, so other processes and threads never read half an entry,
+            # each writer having its own temporary file
+            handle, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+            try:
+                with os.fdopen(handle, "w", encoding="utf-8") as file:
+                    file.write(module_source)
+                os.replace(temporary, path)
+            except OSError:
+                self.remove(temporary)
+                raise
+        except OSError:
+            return
+
+        self.evict()
+
+    # Removes the least recently used entries until the cache holds at most max_bytes
+    def evict(self):
+        try:
+            entries = [entry for entry in os.scandir(self.path) if entry.name.endswith(".py")]
+            stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        if os.path.isdir(self.path):
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(".py") or entry.name.endswith(".tmp"):
+                    self.remove(entry.path)
+
+
+cache = KernelCache(os.environ.get("NOMOGRAPH_CACHE_DIR"))
+
+
+# Uses another cache (e.g. a temporary one, or KernelCache("") for none) within a block
+@contextlib.contextmanager
+def use(other):
+    global cache
+    previous, cache = cache, other
+    try:
+        yield other
+    finally:
+        cache = previous
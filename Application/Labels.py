@@ -0,0 +1,85 @@
+import numpy as np
+
+
+# Text extents of one font, every text being measured once
+# measure is e.g. the measure of a Tk font, or an approximation when there is no display
+class FontMetrics():
+    def __init__(self, measure, height):
+        self.measure = measure
+        self.height = height
+
+        self.widths = {}
+
+    def width(self, text):
+        width = self.widths.get(text)
+        if width is None:
+            width = self.measure(text)
+            self.widths[text] = width
+
+        return width
+
+
+# Places labels without overlapping the ones placed before, in order, keeping the boxes
+# of the placed labels in a spatial hash so every label is only compared to its neighbours
+# A colliding label is nudged outwards along its normal, then suppressed if it still collides
+class LabelPlacer():
+    def __init__(self, metrics, padding=1):
+        self.metrics = metrics
+        self.padding = padding
+
+        # About the size of a label, so a box only covers a few cells
+        self.cell_size = 4 * (metrics.height + 2*padding)
+        self.cells = {}
+
+    def get_cells(self, box):
+        x_min, y_min, x_max, y_max = box
+        i_min, i_max = int(x_min // self.cell_size), int(x_max // self.cell_size)
+        j_min, j_max = int(y_min // self.cell_size), int(y_max // self.cell_size)
+
+        return [(i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)]
+
+    def collides(self, box):
+        x_min, y_min, x_max, y_max = box
+        for cell in self.get_cells(box):
+            for other in self.cells.get(cell, ()):
+                if x_min < other[2] and other[0] < x_max and y_min < other[3] and other[1] < y_max:
+                    return True
+
+        return False
+
+    def add(self, box):
+        for cell in self.get_cells(box):
+            self.cells.setdefault(cell, []).append(box)
+
+    # Adds labels placed before (e.g. by another placer) centered on positions, without checking them
+    def add_labels(self, positions, texts):
+        height = self.metrics.height + 2*self.padding
+        for (x, y), text in zip(np.asarray(positions, dtype=float).reshape(-1, 2).tolist(), texts):
+            width = self.metrics.width(text) + 2*self.padding
+            self.add((x - width/2, y - height/2, x + width/2, y + height/2))
+
+    # Gets the positions (K, 2) of the labels centered on positions and whether each is kept
+    def place(self, positions, texts, normals=None):
+        positions = np.array(positions, dtype=float).reshape(-1, 2)
+        keep = np.zeros(len(positions), dtype=bool)
+
+        height = self.metrics.height + 2*self.padding
+        for ind, ((x, y), text) in enumerate(zip(positions.tolist(), texts)):
+            width = self.metrics.width(text) + 2*self.padding
+
+            candidates = [(x, y)]
+            if normals is not None:
+                # One box further out, its extent along the normal
+                nx, ny = normals[ind]
+                step = abs(nx)*width + abs(ny)*height
+                candidates.append((x + step*nx, y + step*ny))
+
+            for cx, cy in candidates:
+                box = (cx - width/2, cy - height/2, cx + width/2, cy + height/2)
+                if not self.collides(box):
+                    self.add(box)
+                    positions[ind] = cx, cy
+                    keep[ind] = True
+                    break
+
+        return positions, keep
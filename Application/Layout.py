@@ -0,0 +1,204 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Trace
+
+# Bounds of the searched parameters: the perspective (a, b) sends the line 1 + a*x + b*y = 0 of the
+# normalized chart to infinity, which must stay out of the unit square, and the shear angles are
+# those of Nomograph.shear
+PERSPECTIVE_BOUNDS = (-0.8, 4)
+SHEAR_BOUNDS = (-np.pi / 4, np.pi / 4)
+
+
+# Homogeneous points (R, S, 3) of every row of a nomograph on a grid of its range, in the base
+# coordinates, and whether each row is graduated (the turning axes only count in the bounds)
+def get_samples(nomograph, samples=33):
+    nomograph.update_axis_ranges()
+    rows = nomograph.get_rows()
+
+    points = np.stack([nomograph.sample_row(row, samples) for row in rows])
+    graduated = np.array([nomograph.row_variables[row] is not None for row in rows])
+
+    return points, graduated
+
+
+# Affine matrix moving the finite points to the unit square, so the parameters mean the same for every chart
+def normalize(points):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x, y = points[..., 0] / points[..., 2], points[..., 1] / points[..., 2]
+    is_finite = np.isfinite(x) & np.isfinite(y)
+
+    x_min, x_max = x[is_finite].min(), x[is_finite].max()
+    y_min, y_max = y[is_finite].min(), y[is_finite].max()
+    width, height = max(x_max - x_min, 1e-12), max(y_max - y_min, 1e-12)
+
+    return np.array([
+        [1 / width,         0,                  0],
+        [0,                 1 / height,         0],
+        [-x_min / width,    -y_min / height,    1]
+    ])
+
+
+# Perspective then shear matrices (K, 3, 3) of parameters (K, 4) as (a, b, theta_x, theta_y)
+def get_matrices(params):
+    a, b, theta_x, theta_y = params.T
+    matrices = np.zeros((len(params), 3, 3))
+
+    # Row vectors [x, y, w] become [x cos(tx) + y sin(ty), x sin(tx) + y cos(ty), a x + b y + w]
+    matrices[:, 0, 0] = np.cos(theta_x)
+    matrices[:, 0, 1] = np.sin(theta_x)
+    matrices[:, 1, 0] = np.sin(theta_y)
+    matrices[:, 1, 1] = np.cos(theta_y)
+    matrices[:, 0, 2] = a
+    matrices[:, 1, 2] = b
+    matrices[:, 2, 2] = 1
+
+    return matrices
+
+
+# Matrices (K, 3, 3) scaling and translating the points (K, N, 2) into the page, with a margin
+def fit_matrices(x, y, page, margin):
+    width, height = page
+
+    # The layouts sending everything to infinity have no bounds, they get a NaN fit
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        x_min, x_max = np.nanmin(x, axis=1), np.nanmax(x, axis=1)
+        y_min, y_max = np.nanmin(y, axis=1), np.nanmax(y, axis=1)
+
+        sx = (width - 2*margin) / (x_max - x_min)
+        sy = (height - 2*margin) / (y_max - y_min)
+
+        fit = np.zeros((len(x), 3, 3))
+        fit[:, 0, 0] = sx
+        fit[:, 1, 1] = sy
+        fit[:, 2, 0] = margin - sx*x_min
+        fit[:, 2, 1] = margin - sy*y_min
+        fit[:, 2, 2] = 1
+
+    return fit
+
+
+# Scores (K,) of the layouts of parameters (K, 4), the higher the better, -inf if a layout sends
+# some of the chart to infinity: the mean length of the graduated scales relative to the page diagonal,
+# times how evenly spaced their samples are (1 if every scale is evenly graduated)
+def score_layouts(points, graduated, params, page, margin):
+    matrices = get_matrices(params)
+    transformed = np.einsum("rsi,kij->krsj", points, matrices)
+
+    w = transformed[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = transformed[..., 0] / w
+        y = transformed[..., 1] / w
+
+    # Every finite sample must stay on the same side of the line sent to infinity, i.e. keep the
+    # sign of its w (the points at infinity of the chart, of w = 0, on the side of the positive ones)
+    is_finite = np.isfinite(points).all(axis=-1)
+    sides = np.where(points[..., 2] < 0, -1, 1)
+    is_valid = ((w*sides > 1e-9) | ~is_finite).all(axis=(1, 2))
+
+    x = np.where(is_finite, x, np.nan).reshape(len(params), -1)
+    y = np.where(is_finite, y, np.nan).reshape(len(params), -1)
+    fit = fit_matrices(x, y, page, margin)
+    with np.errstate(invalid="ignore"):
+        x = x*fit[:, 0, 0, None] + fit[:, 2, 0, None]
+        y = y*fit[:, 1, 1, None] + fit[:, 2, 1, None]
+
+    # Lengths of the segments between the samples of the graduated scales (K, G, S - 1)
+    shape = (len(params),) + points.shape[:2]
+    x, y = x.reshape(shape)[:, graduated], y.reshape(shape)[:, graduated]
+    lengths = np.hypot(np.diff(x, axis=-1), np.diff(y, axis=-1))
+
+    # The scales without any finite segment (e.g. in an invalid layout) have NaN spreads
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        length = np.nanmean(np.nansum(lengths, axis=-1), axis=-1) / np.hypot(*page)
+
+        # Spread of the log spacing of the samples, evenly spaced in t (or log t), 0 when evenly spaced on the page
+        log_lengths = np.log(lengths)
+        log_lengths = np.where(np.isfinite(log_lengths), log_lengths, np.nan)
+        uniformity = np.exp(-np.nanmean(np.nanstd(log_lengths, axis=-1), axis=-1))
+
+    scores = length * uniformity
+    return np.where(is_valid & np.isfinite(scores), scores, -np.inf)
+
+
+def score_chunk(job):
+    return score_layouts(*job)
+
+
+# Searches the perspective and shear of the best layout of the samples in the page
+# Each round scores a batch of candidates, split across the worker processes, the first one
+# spread over the whole parameter space, then around the best candidates with a shrinking spread
+# Returns the transformation matrix of the layout (normalization, perspective, shear then fit) and its score
+# Raises ValueError if no layout keeps the chart finite, e.g. for a degenerate chart
+def search(points, graduated, page=(800, 600), margin=20, candidates=2048, rounds=5, keep=8, workers=None, seed=0):
+    rng = np.random.default_rng(seed)
+    normalization = normalize(points)
+    points = points @ normalization
+
+    lower = np.array([PERSPECTIVE_BOUNDS[0]] * 2 + [SHEAR_BOUNDS[0]] * 2)
+    upper = np.array([PERSPECTIVE_BOUNDS[1]] * 2 + [SHEAR_BOUNDS[1]] * 2)
+
+    # The untouched chart is always a candidate, so the layout is never worse than just fitting it
+    params = np.vstack((np.zeros((1, 4)), rng.uniform(lower, upper, (candidates - 1, 4))))
+    spread = (upper - lower) / 4
+
+    workers = os.cpu_count() if workers is None else workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        best_params = np.empty((0, 4))
+        best_scores = np.empty(0)
+        for _ in range(rounds):
+            with Trace.span("score_layouts", candidates=len(params)):
+                chunks = np.array_split(params, workers if executor is not None else 1)
+                jobs = [(points, graduated, chunk, page, margin) for chunk in chunks if len(chunk)]
+                results = executor.map(score_chunk, jobs) if executor is not None else map(score_chunk, jobs)
+                scores = np.concatenate(list(results))
+
+            # Keep the best candidates over all rounds
+            best_params = np.vstack((best_params, params))
+            best_scores = np.concatenate((best_scores, scores))
+            order = np.argsort(-best_scores)[:keep]
+            best_params, best_scores = best_params[order], best_scores[order]
+
+            # Sample around them with a smaller spread
+            centers = best_params[rng.integers(0, len(best_params), candidates)]
+            params = np.clip(centers + rng.normal(0, spread, (candidates, 4)), lower, upper)
+            spread = spread / 2
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if not np.isfinite(best_scores[0]):
+        raise ValueError("No layout keeps the chart finite and of a non-zero size")
+
+    best = best_params[:1]
+    matrix = normalization @ get_matrices(best)[0]
+
+    # Fit the best layout in the page
+    transformed = points @ get_matrices(best)[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (transformed[..., 0] / transformed[..., 2]).reshape(1, -1)
+        y = (transformed[..., 1] / transformed[..., 2]).reshape(1, -1)
+    is_finite = np.isfinite(x) & np.isfinite(y)
+    fit = fit_matrices(np.where(is_finite, x, np.nan), np.where(is_finite, y, np.nan), page, margin)[0]
+
+    return matrix @ fit, best_scores[0]
+
+
+# Finds and applies the best layout of a nomograph in the page, replacing its transformation
+def optimize(nomograph, page=(800, 600), margin=20, samples=33, **kwargs):
+    points, graduated = get_samples(nomograph, samples)
+    matrix, score = search(points, graduated, page, margin, **kwargs)
+
+    apply(nomograph, matrix)
+    return score
+
+
+def apply(nomograph, matrix):
+    nomograph.replace_transform(matrix)
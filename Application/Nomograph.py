@@ -1,5 +1,13 @@
+import collections
+import functools
+import threading
+
 import numpy as np
 import sympy as sp
+
+import History
+import KernelCache
+import Trace
 # from tkinter import Canvas
 
 
@@ -9,9 +17,11 @@ class Nomograph():
         self.name = name
         self.t = sp.symbols('t')
 
-        self.funcs = ["t" for _ in func_vars] if (funcs is None) else [sp.parse_expr(func) for func in funcs]
+        self.funcs = [self.t for _ in func_vars] if (funcs is None) else [sp.parse_expr(func) for func in funcs]
 
         self.variables = max(func_vars) + 1
+        # Variable graduating each row of the base matrix, None for the ungraduated turning axes
+        self.row_variables = list(range(self.variables))
 
         self.value_ranges = [Ticks(0, 1, 0.25, 0.05) for _ in range(self.variables)]
         if not (ranges is None):
@@ -25,15 +35,36 @@ class Nomograph():
             [0, 0, 1]
         ])
 
-        self.transformation_matrix = sp.Matrix([
-            [1, 0, 0],
-            [0, 1, 0],
-            [0, 0, 1]
-        ])
+        # The transformations are float homographies applied to the evaluated base rows
+        self.transformation_matrix = np.identity(3)
+        # Committed transformations, to undo and redo them
+        self.history = History.TransformHistory()
         # self.transformations = []
         self.current_transformation = None
 
-        self.current_matrix = self.base_matrix
+        self.current_matrix = self.transformation_matrix
+
+        # Compiled kernels of each row, only rebuilt when the row changes
+        self.kernels = {}
+        # Whether the rows are evaluated together by one kernel fusing them, for the charts of many rows
+        self.batch_rows = False
+
+        # Ranges of the turning axes, computed from the ranges of the scales
+        self.axis_ranges = {}
+
+        # Maximum distance (in pixels) between a sampled curve and its polyline
+        self.tolerance = 0.25
+        # Number of points emitted for each row by the last draw
+        self.point_counts = {}
+
+        # Level of detail: the ticks closer than this (in pixels) to their neighbours are not drawn
+        # (half of it for the major ticks), nor the labels closer than min_label_spacing
+        self.min_tick_spacing = 3
+        self.min_label_spacing = 12
+
+        # Geometry of every row along with the state of each aspect it was computed for, so only
+        # the rows with an aspect that changed since are computed again
+        self.geometry_cache = {}
 
         if not (other is None):
             self.copy(other)
@@ -47,13 +78,41 @@ class Nomograph():
 
         return self.value_ranges[index]
 
+    # Gets the range of a row of the base matrix, either of its variable or of its turning axis
+    def get_range(self, row):
+        if row in self.axis_ranges:
+            return self.axis_ranges[row]
+
+        return self.value_ranges[self.row_variables[row]]
+
+    # Gets the rows graduated by the given variables, or every row (turning axes included) if None
+    def get_rows(self, variables=None):
+        if variables is None:
+            return list(range(self.base_matrix.rows))
+
+        return [row for row, variable in enumerate(self.row_variables) if variable in variables]
+
+    # Computes the ranges of the turning axes, the charts having some override it
+    def update_axis_ranges(self):
+        pass
+
+    # Homogeneous points of a row on a grid of its range, e.g. to find the range of its function
+    def sample_row(self, row, points=65):
+        value_range = self.get_range(row)
+        if value_range.is_log:
+            ts = np.geomspace(value_range.min, value_range.max, points)
+        else:
+            ts = np.linspace(value_range.min, value_range.max, points)
+
+        return self.get_kernel(row)(ts)[0]
+
     # Scales the axes
     def scale(self, x, y):
-        S = sp.Matrix([
+        S = np.array([
             [x,   0,   0],
             [0,   y,   0],
             [0,   0,   1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * S
         # self.transformations.append(S)
@@ -61,11 +120,11 @@ class Nomograph():
 
     # Scales the axes while keeping a point without moving
     def scale_at_point(self, sx, sy, px, py):
-        S = sp.Matrix([
+        S = np.array([
             [sx,        0,          0],
             [0,         sy,         0],
             [(1-sx)*px, (1-sy)*py,  1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * S
         # self.transformations.append(S)
@@ -73,11 +132,11 @@ class Nomograph():
 
     # Translates the axes
     def translate(self, x, y):
-        T = sp.Matrix([
+        T = np.array([
             [1,   0,   0],
             [0,   1,   0],
             [x,   y,   1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * T
         # self.transformations.append(T)
@@ -86,13 +145,13 @@ class Nomograph():
     # Rotates around the origin by and angle theta
     def rotate(self, theta=None, deg=None):
         if not(deg is None):
-            theta = deg * sp.pi / 180
+            theta = deg * np.pi / 180
 
-        R = sp.Matrix([
-            [sp.cos(theta), -sp.sin(theta), 0],
-            [sp.sin(theta), sp.cos(theta),  0],
+        R = np.array([
+            [np.cos(theta), -np.sin(theta), 0],
+            [np.sin(theta), np.cos(theta),  0],
             [0,             0,              1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * R
         # self.transformations.append(R)
@@ -101,16 +160,16 @@ class Nomograph():
     # Rotates around a point by and angle theta
     def rotate_point(self, px, py, theta=None, deg=None):
         if not(deg is None):
-            theta = deg * sp.pi / 180
+            theta = deg * np.pi / 180
 
-        cos = sp.cos(theta)
-        sin = sp.sin(theta)
+        cos = np.cos(theta)
+        sin = np.sin(theta)
 
-        R = sp.Matrix([
+        R = np.array([
             [cos, -sin, 0],
             [sin, cos,  0],
             [(1-cos)*px-sin*py, (1-cos)*py+sin*px, 1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * R
         # self.transformations.append(R)
@@ -118,11 +177,11 @@ class Nomograph():
 
     # Shears the axes by their corresponding values
     def shear(self, theta_x, theta_y):
-        S = sp.Matrix([
-            [sp.cos(theta_x), sp.sin(theta_x),  0],
-            [sp.sin(theta_y), sp.cos(theta_y),  0],
+        S = np.array([
+            [np.cos(theta_x), np.sin(theta_x),  0],
+            [np.sin(theta_y), np.cos(theta_y),  0],
             [0,               0,                1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * S
         # self.transformations.append(S)
@@ -130,22 +189,22 @@ class Nomograph():
 
     # Flips the two axes (same as a rotation by 90 then a reflection)
     def flip(self):
-        F = sp.Matrix([
+        F = np.array([
             [0,   1,   0],
             [1,   0,   0],
             [0,   0,   1]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * F
         # self.transformations.append(F)
         self.current_transformation = F
 
     def project(self, xp, yp, zp):
-        P = sp.Matrix([
+        P = np.array([
             [zp,  yp,   1],
             [0,   -xp,  0],
             [0,   0,    -xp]
-        ])
+        ], dtype=float)
 
         # self.current_matrix = self.current_matrix * F
         # self.transformations.append(F)
@@ -156,299 +215,1136 @@ class Nomograph():
             return
 
         # self.transformations.append(self.current_transformation)
-        self.transformation_matrix = self.transformation_matrix * self.current_transformation
+        self.transformation_matrix = self.history.push(self.current_transformation)
         self.current_transformation = None
 
         self.transform()
 
+    # Replaces the whole transformation, as a single step of the history
+    def replace_transform(self, transformation):
+        self.transformation_matrix = self.history.push(transformation, is_absolute=True)
+        self.current_transformation = None
+
+        self.transform()
+
+    # Go back and forth in the history of the committed transformations, without recompiling anything
+    # Return whether there was something to undo or redo
+    def undo_transform(self):
+        return self.set_history_matrix(self.history.undo())
+
+    def redo_transform(self):
+        return self.set_history_matrix(self.history.redo())
+
+    def set_history_matrix(self, matrix):
+        if matrix is None:
+            return False
+
+        self.transformation_matrix = matrix
+        self.current_transformation = None
+        self.transform()
+        return True
+
     # Aligns an axis with a desired curve (if possible) TODO
     def align(self, index, x, y):
         pass
 
-    # Reduced the matrix to a nomographic form TODO
-    def reduce(self):
-        # easiest way to reduce is simply divide each row by the last column's value
-        is_ok = True
-        for row in range(self.variables):
-            temp_val = self.current_matrix[row, 2]
-            if temp_val != 1:
-                self.current_matrix[row, 0] /= temp_val
-                self.current_matrix[row, 1] /= temp_val
+    # Reduces transformed homogeneous samples (N, 3) to a nomographic form
+    # Also reduces their derivatives with the quotient rule if they are given
+    @Trace.traced("reduce")
+    def reduce(self, points, derivs=None):
+        # easiest way to reduce is simply divide each sample by its last column's value
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = points[..., 2]
+            x = points[..., 0] / w
+            y = points[..., 1] / w
+
+            if derivs is None:
+                return x, y
+
+            dxdt = (derivs[..., 0] * w - points[..., 0] * derivs[..., 2]) / (w * w)
+            dydt = (derivs[..., 1] * w - points[..., 1] * derivs[..., 2]) / (w * w)
+
+        return x, y, dxdt, dydt
 
     # Performs the transformations in the queue
+    @Trace.traced("transform")
     def transform(self):
         # self.current_matrix = self.base_matrix
 
         # for xfrm in self.transformations:
         #     self.current_matrix = self.current_matrix * xfrm
-        self.current_matrix = self.base_matrix * self.transformation_matrix
+        self.current_matrix = self.transformation_matrix
 
         if self.current_transformation is not None:
-            self.current_matrix = self.current_matrix * self.current_transformation
-
-        self.reduce()
+            self.current_matrix = self.current_matrix @ self.current_transformation
 
     def reset_transform(self):
-        self.transformation_matrix = sp.Matrix([
-            [1, 0, 0],
-            [0, 1, 0],
-            [0, 0, 1]
-        ])
+        self.transformation_matrix = self.history.push(np.identity(3), is_absolute=True)
 
     def get_transform(self):
         self.execute_last_transform()
         return self.current_transformation
 
     def set_transform(self, transformation):
-        self.current_transformation = transformation
+        self.current_transformation = np.array(transformation, dtype=float)
         self.transform()
 
     def cancel_transform(self):
         self.current_transformation = None
 
-    # Sets the base matrix and recomputes the transformations
+    # Sets the base matrix (a sympy matrix or nested lists of expressions or strings) and
+    # recomputes the transformations, the kernels of the rows that changed are recompiled when used
     def set_base_matrix(self, base):
-        self.base_matrix = base
+        self.base_matrix = sp.Matrix(base)
         self.transform()
 
-    # Draw the nomograph on a screen TODO
-    def draw(self, draw_line_func, gui_draw_text, tick_size, variables=None):
-        # if None, then draw all variables, otherwise just the indexes sent
-        if variables is None:
-            variables_to_draw = [i for i in range(self.variables)]
+    # Gets the compiled kernel of a row, recompiling only if its expressions changed
+    def get_kernel(self, row):
+        key = tuple(self.base_matrix.row(row))
+
+        kernel = self.kernels.get(row)
+        if kernel is None or kernel.key != key:
+            Trace.count("kernel_misses")
+            kernel = compile_row(self.t, key)
+            self.kernels[row] = kernel
+        else:
+            Trace.count("kernel_hits")
+
+        return kernel
+
+    # Gets the kernel fusing some rows, recompiling it only if their expressions changed
+    def get_rows_kernel(self, rows):
+        rows = tuple(rows)
+        keys = tuple(tuple(self.base_matrix.row(row)) for row in rows)
+
+        kernel = self.kernels.get(rows)
+        if kernel is None or kernel.key != keys:
+            Trace.count("kernel_misses")
+            kernel = compile_rows(self.t, keys)
+            self.kernels[rows] = kernel
+        else:
+            Trace.count("kernel_hits")
+
+        return kernel
+
+    # Evaluates the transformed and reduced x, y, dx/dt and dy/dt of a row at every t
+    def evaluate(self, row, ts):
+        points, derivs = self.get_kernel(row)(ts)
+
+        with np.errstate(invalid="ignore", over="ignore"):
+            points = points @ self.current_matrix
+            derivs = derivs @ self.current_matrix
+
+        return self.reduce(points, derivs)
+
+    # Samples a row between t_min and t_max as a polyline on the screen
+    # Starts from a coarse grid and splits every segment whose chord is further than the
+    # tolerance from the curve, then drops the points lying on a straight line
+    @Trace.traced("sample")
+    def sample(self, row, t_min, t_max, initial_points=17, max_depth=16):
+        ts = np.linspace(t_min, t_max, initial_points)
+        x, y, dx, dy = self.evaluate(row, ts)
+
+        to_check = np.arange(len(ts) - 1)
+        for _ in range(max_depth):
+            if len(to_check) == 0:
+                break
+
+            start = to_check
+            end = to_check + 1
+            mid_ts = (ts[start] + ts[end]) / 2
+            mid_x, mid_y, mid_dx, mid_dy = self.evaluate(row, mid_ts)
+
+            # The curve is within 3/4 of the distance of its Hermite control points from the chord,
+            # which also catches the curves going back and forth past the ends of the chord
+            h = (ts[end] - ts[start]) / 3
+            error = np.maximum.reduce([
+                segment_distance(mid_x, mid_y, x[start], y[start], x[end], y[end]),
+                0.75*segment_distance(x[start] + h*dx[start], y[start] + h*dy[start], x[start], y[start], x[end], y[end]),
+                0.75*segment_distance(x[end] - h*dx[end], y[end] - h*dy[end], x[start], y[start], x[end], y[end])
+            ])
+            split = error > self.tolerance
+
+            to_check = to_check[split]
+            ts = np.insert(ts, to_check + 1, mid_ts[split])
+            x = np.insert(x, to_check + 1, mid_x[split])
+            y = np.insert(y, to_check + 1, mid_y[split])
+            dx = np.insert(dx, to_check + 1, mid_dx[split])
+            dy = np.insert(dy, to_check + 1, mid_dy[split])
+
+            # Both halves of every split segment have to be checked again
+            to_check = to_check + np.arange(len(to_check))
+            to_check = np.stack((to_check, to_check + 1), axis=-1).ravel()
+
+        if len(ts) > 2:
+            error = segment_distance(x[1:-1], y[1:-1], x[:-2], y[:-2], x[2:], y[2:])
+            keep = np.concatenate(([True], ~(error <= 1e-3 * self.tolerance), [True]))
+            ts, x, y = ts[keep], x[keep], y[keep]
+
+        return ts, x, y
+
+    # Refines values of t near the closest points of a row to the screen points (x, y) with
+    # Gauss-Newton steps, only taking the steps getting closer so a fold of the curve cannot
+    # send t to another of its branches, and staying in the range of the row
+    def closest_t(self, row, ts, x, y, iterations=4):
+        value_range = self.get_range(row)
+        ts = np.array(ts, dtype=float)
+
+        px, py, dxdt, dydt = self.evaluate(row, ts)
+        distance = np.hypot(px - x, py - y)
+        for _ in range(iterations):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = ((px - x)*dxdt + (py - y)*dydt) / (dxdt*dxdt + dydt*dydt)
+            new_ts = np.clip(np.where(np.isfinite(step), ts - step, ts), value_range.min, value_range.max)
+
+            new_px, new_py, new_dxdt, new_dydt = self.evaluate(row, new_ts)
+            new_distance = np.hypot(new_px - x, new_py - y)
+
+            closer = new_distance < distance
+            if not closer.any():
+                break
+
+            ts = np.where(closer, new_ts, ts)
+            px, py = np.where(closer, new_px, px), np.where(closer, new_py, py)
+            dxdt, dydt = np.where(closer, new_dxdt, dxdt), np.where(closer, new_dydt, dydt)
+            distance = np.where(closer, new_distance, distance)
+
+        return ts
+
+    # Positions of the ticks at ts and their unit normals to the curve
+    def get_tick_normals(self, row, ts):
+        return tick_normals(*self.evaluate(row, ts))
+
+    # Evaluates x, y, dx/dt and dy/dt of many rows, each at its own ts, in one pass of their fused kernel
+    def evaluate_rows(self, ts_by_row):
+        rows = list(ts_by_row)
+        counts = [len(ts) for ts in ts_by_row.values()]
+
+        # Every row gets as many values, the padding is evaluated and dropped
+        padded = np.full((len(rows), max(counts + [1])), np.nan)
+        for ind, ts in enumerate(ts_by_row.values()):
+            padded[ind, :len(ts)] = ts
+
+        points, derivs = self.get_rows_kernel(rows)(padded)
+        with np.errstate(invalid="ignore", over="ignore"):
+            points = points @ self.current_matrix
+            derivs = derivs @ self.current_matrix
+        values = self.reduce(points, derivs)
+
+        return {row: tuple(value[ind, :count] for value in values) for ind, (row, count) in enumerate(zip(rows, counts))}
+
+    # Positions and unit normals of the major and minor ticks of rows, evaluated in one pass
+    def get_rows_tick_normals(self, rows):
+        ticks = {row: self.get_range(row).get_ticks() for row in rows}
+        values = self.evaluate_rows({row: np.concatenate(ticks[row]) for row in rows})
+
+        normals = {}
+        for row in rows:
+            count = len(ticks[row][0])
+            px, py, mx, my = tick_normals(*values[row])
+            normals[row] = ((px[:count], py[:count], mx[:count], my[:count]), (px[count:], py[count:], mx[count:], my[count:]))
+
+        return normals
+
+    # Computes the geometry of one row as arrays, ready to be rendered or exported
+    # Only keeps what may be seen within the viewport (x_min, y_min, x_max, y_max) if it is given
+    # The normals of its major and minor ticks can be given if they were evaluated along other rows
+    def get_scale_geometry(self, row, tick_size, viewport=None, normals=None):
+        value_range = self.get_range(row)
+
+        # The ticks and labels just outside of the viewport can still reach into it
+        if viewport is not None:
+            bounds = expand_bounds(viewport, 5*tick_size)
+
+        # -----------------------------
+        # Curve
+        # -----------------------------
+        ts, x, y = self.sample(row, value_range.min, value_range.max)
+        self.point_counts[row] = len(ts)
+        Trace.count("points_sampled", len(ts))
+
+        curve_ts, curves = split_finite(ts, np.column_stack((x, y)))
+
+        if viewport is not None:
+            clipped = [clip_polyline(part_ts, curve, bounds) for part_ts, curve in zip(curve_ts, curves)]
+            curve_ts = [part for parts, _ in clipped for part in parts]
+            curves = [part for _, parts in clipped for part in parts]
+
+        # -----------------------------
+        # Graduations of t
+        # -----------------------------
+        with Trace.span("ticks", row=row):
+            major_ticks, minor_ticks = value_range.get_ticks()
+        Trace.count("ticks", len(major_ticks) + len(minor_ticks))
+
+        ticks = []
+        tick_major = []
+        if normals is None:
+            normals = (self.get_tick_normals(row, major_ticks), self.get_tick_normals(row, minor_ticks))
+
+        for values, length, is_major, (px, py, mx, my) in (
+            (major_ticks, 2*tick_size, True, normals[0]), (minor_ticks, tick_size, False, normals[1])
+        ):
+            spacing = neighbour_spacing(px, py)
+
+            visible = spacing >= (self.min_tick_spacing / 2 if is_major else self.min_tick_spacing)
+            ticks.append(np.stack((
+                np.column_stack((px + length*mx, py + length*my)),
+                np.column_stack((px - length*mx, py - length*my))
+            ), axis=1)[visible])
+            tick_major.append(np.full(visible.sum(), is_major))
+
+            # Label (parameter value) of the major ticks
+            if is_major:
+                has_label = visible & (spacing >= self.min_label_spacing)
+                labels = np.column_stack((px + 4*tick_size*mx, py + 4*tick_size*my))[has_label]
+                label_normals = np.column_stack((mx, my))[has_label]
+                label_values = values[has_label]
+
+        ticks = np.concatenate(ticks)
+        tick_major = np.concatenate(tick_major)
+        is_drawn = np.isfinite(ticks).all(axis=(1, 2))
+        has_label = np.isfinite(labels).all(axis=1)
+
+        if viewport is not None:
+            is_drawn &= segments_in_bounds(ticks[:, 0], ticks[:, 1], bounds)
+            has_label &= segments_in_bounds(labels, labels, bounds)
+
+        texts = [value_range.label(ti) for ti in label_values[has_label]]
+
+        return ScaleGeometry(
+            row, curves, curve_ts, ticks[is_drawn], tick_major[is_drawn], labels[has_label], texts, label_normals[has_label]
+        )
+
+    # Computes the geometry of the scales one at a time, so it can be streamed
+    # Without cache (e.g. to export the whole chart) nothing is kept, so only one scale is held at a time
+    def iter_scale_geometry(self, tick_size, variables=None, viewport=None, cache=True):
+        # if None, then get all variables, otherwise just the indexes sent
+        self.update_axis_ranges()
+        rows = self.get_rows(variables)
+
+        # The rows whose aspects are all unchanged give the same geometry as before
+        if cache:
+            states = {row: self.get_row_state(row, tick_size, viewport) for row in rows}
+            dirty = {row for row in rows if row not in self.geometry_cache or self.geometry_cache[row][0] != states[row]}
         else:
-            variables_to_draw = variables[:]
-
-        for var in variables_to_draw:
-            x_func = np.vectorize(sp.lambdify(self.t, self.current_matrix[var, 0], "numpy"))
-            y_func = np.vectorize(sp.lambdify(self.t, self.current_matrix[var, 1], "numpy"))
-
-            dxdt = np.vectorize(sp.lambdify(self.t, sp.diff(self.current_matrix[var, 0], self.t), "numpy"))
-            dydt = np.vectorize(sp.lambdify(self.t, sp.diff(self.current_matrix[var, 1], self.t), "numpy"))
-
-            # -----------------------------
-            # Parameter range
-            # -----------------------------
-            t_min = self.value_ranges[var].min
-            t_max = self.value_ranges[var].max
-            num_points = 1000
-            ts = np.linspace(t_min, t_max, num_points)
-
-            # -----------------------------
-            # Draw curve
-            # -----------------------------
-            points = np.column_stack((x_func(ts), y_func(ts)))
-
-            draw_line_func(self.name, points.tolist())
-
-            # -----------------------------
-            # Draw graduations of t
-            # -----------------------------
-            major_ticks, minor_ticks = self.value_ranges[var].get_ticks()
-            px = x_func(major_ticks)
-            py = y_func(major_ticks)
-
-            angle = np.arctan2(-dxdt(major_ticks), dydt(major_ticks))
-            mx = np.cos(angle)
-            my = np.sin(angle)
-            points = np.column_stack((major_ticks, px, py, mx, my))
-
-            for ti, px, py, mx, my in points:
-                p1x = px + 2*tick_size*mx
-                p1y = py + 2*tick_size*my
-                p2x = px - 2*tick_size*mx
-                p2y = py - 2*tick_size*my
-
-                draw_line_func(self.name, [[p1x, p1y], [p2x, p2y]])
-
-                p1x = px + 4*tick_size*mx
-                p1y = py + 4*tick_size*my
-
-                # Label (parameter value)
-                gui_draw_text(self.name, p1x, p1y, f"{ti:.2f}")
-
-            px = x_func(minor_ticks)
-            py = y_func(minor_ticks)
-
-            angle = np.arctan2(-dxdt(minor_ticks), dydt(minor_ticks))
-            mx = np.cos(angle)
-            my = np.sin(angle)
-            p1x = px + tick_size*mx
-            p1y = py + tick_size*my
-            p2x = px - tick_size*mx
-            p2y = py - tick_size*my
-            points = np.column_stack((minor_ticks, p1x, p1y, p2x, p2y, px, py))
-
-            for ti, p1x, p1y, p2x, p2y, px, py in points:
-                draw_line_func(self.name, [[p1x, p1y], [p2x, p2y]])
+            dirty = set(rows)
+
+        # The ticks of all the graduated rows are evaluated at once when batching them, unless
+        # only some of them changed
+        normals = {}
+        graduated = self.get_rows(range(self.variables))
+        if self.batch_rows and dirty.issuperset(graduated):
+            with Trace.span("tick_normals"):
+                normals = self.get_rows_tick_normals(graduated)
+
+        for row in rows:
+            if row in dirty:
+                with Trace.span("scale_geometry", row=row):
+                    scale = self.get_scale_geometry(row, tick_size, viewport, normals.get(row))
+                if cache:
+                    self.geometry_cache[row] = (states[row], scale)
+                Trace.count("scales_computed")
+            else:
+                scale = self.geometry_cache[row][1]
+                Trace.count("scales_reused")
+
+            yield scale
+
+    # State of each aspect the geometry of a row depends on: its expressions, its ticks (along with
+    # the level of detail) and its transformation (along with the viewport and sampling tolerance)
+    def get_row_state(self, row, tick_size, viewport=None):
+        return {
+            "expression": tuple(self.base_matrix.row(row)),
+            "ticks": self.get_range(row).get_state() + (tick_size, self.min_tick_spacing, self.min_label_spacing),
+            "transform": (self.current_matrix.tobytes(), viewport, self.tolerance)
+        }
+
+    def clear_geometry(self):
+        self.geometry_cache.clear()
+
+    # Computes the geometry of the nomograph without drawing anything
+    def get_draw_list(self, tick_size, variables=None, viewport=None, cache=True):
+        return DrawList(self.name, list(self.iter_scale_geometry(tick_size, variables, viewport, cache)))
+
+    # Draw the nomograph on a screen through the given callbacks
+    @Trace.traced("draw")
+    def draw(self, draw_line_func, gui_draw_text, tick_size, variables=None):
+        draw_list = self.get_draw_list(tick_size, variables)
+
+        for scale in draw_list.scales:
+            for curve in scale.curves:
+                draw_line_func(self.name, curve.tolist())
+
+            for segment in scale.ticks.tolist():
+                draw_line_func(self.name, segment)
+
+            for (px, py), text in zip(scale.labels.tolist(), scale.texts):
+                gui_draw_text(self.name, px, py, text)
 
+    # Base matrix of the nomograph for the given functions, each chart type places them differently
+    def build_base(self, funcs):
+        return self.base_matrix
+
+    @Trace.traced("update_formula")
     def update_formula(self, index, func):
         if isinstance(func, str):
-            self.funcs[index] = sp.parse_expr(func)
-        elif isinstance(func, sp.Symbol):
+            with Trace.span("parse"):
+                self.funcs[index] = sp.parse_expr(func)
+        elif isinstance(func, sp.Basic):
             self.funcs[index] = func
 
+        self.base_matrix = self.build_base(self.funcs)
+        self.transform()
+
+    # Compiles the kernels of the rows of base that differ from the given kernels
+    # Does not modify the nomograph, so it can run on a worker thread
+    @Trace.traced("compile_kernels")
+    def compile_kernels(self, base, kernels):
+        compiled = {}
+        for row in range(base.rows):
+            key = tuple(base.row(row))
+            if row not in kernels or kernels[row].key != key:
+                compiled[row] = compile_row(self.t, key)
+
+        # Along with the kernel fusing the graduated ones
+        if self.batch_rows:
+            rows = tuple(self.get_rows(range(self.variables)))
+            keys = tuple(tuple(base.row(row)) for row in rows)
+            if rows not in kernels or kernels[rows].key != keys:
+                compiled[rows] = compile_rows(self.t, keys)
+
+        return compiled
+
+    # Parses a formula and compiles the rows it would change, without modifying the nomograph
+    # Returns the parsed formula and the kernels to give to set_kernels along with it
+    def compile_formula(self, index, func, funcs, kernels):
+        funcs = funcs[:]
+        with Trace.span("parse"):
+            funcs[index] = sp.parse_expr(func) if isinstance(func, str) else func
+
+        return funcs[index], self.compile_kernels(self.build_base(funcs), kernels)
+
+    # Stores kernels compiled elsewhere, get_kernel still recompiles them if their row changed since
+    def set_kernels(self, kernels):
+        self.kernels.update(kernels)
+
+    # Solves the equation of the nomograph for one variable given arrays of the two others, e.g.
+    # solve(2, {0: a, 1: b}), i.e. finds where the isopleth through a and b crosses the scale of row
+    # The rows are collinear when det(r0, r1, r2) = 0, which is a . r(u) = 0 with a the cross product
+    # of the known rows, so every query is bracketed on a grid of the range then refined with Newton
+    # Returns NaN where there is no solution in the range, the first one if there are several
+    @Trace.traced("solve")
+    def solve(self, row, values, grid_points=32, tolerance=1e-12, max_iterations=50, chunk_size=1 << 13):
+        if self.base_matrix.rows != 3 or self.row_variables != [0, 1, 2]:
+            raise ValueError("Only the charts of three scales in a single determinant can be solved")
+
+        others = [other for other in range(3) if other != row]
+        known = [np.asarray(values[other], dtype=float) for other in others]
+        known = np.broadcast_arrays(*known)
+        shape = known[0].shape
+        known = [value.ravel() for value in known]
+
+        # Cyclic order so the sign of a . r(u) is the sign of the determinant
+        first, second = (row + 1) % 3, (row + 2) % 3
+        kernel, first_kernel, second_kernel = self.get_kernel(row), self.get_kernel(first), self.get_kernel(second)
+
+        value_range = self.value_ranges[row]
+        if value_range.is_log:
+            grid = np.geomspace(value_range.min, value_range.max, grid_points)
+        else:
+            grid = np.linspace(value_range.min, value_range.max, grid_points)
+        grid_values = kernel(grid)[0]
+        width = value_range.max - value_range.min
+
+        result = np.empty(len(known[0]))
+        for start in range(0, len(result), chunk_size):
+            chunk = {other: value[start:start + chunk_size] for other, value in zip(others, known)}
+            a = np.cross(first_kernel(chunk[first])[0], second_kernel(chunk[second])[0])
+            result[start:start + chunk_size] = solve_linear_row(
+                kernel, a, grid, grid_values, tolerance*max(width, 1), max_iterations
+            )
+
+        return result.reshape(shape)
+
     def copy(self, other):
-        self.value_ranges = other.value_ranges[:]
+        # The charts can have more or less variables than the other
+        count = min(self.variables, other.variables)
+        self.value_ranges = other.value_ranges[:count] + self.value_ranges[count:]
         self.current_transformation = other.current_transformation
-        self.transformation_matrix = other.transformation_matrix
+        self.transformation_matrix = other.transformation_matrix.copy()
+        self.history = other.history.copy()
 
         self.base_matrix = other.base_matrix
 
-        for ind, func in enumerate(other.funcs):
+        self.copy_funcs(other)
+
+    # Takes the formulas of another nomograph
+    # The functions of a determinant are elements of its matrix, not formulas of the variables
+    def copy_funcs(self, other):
+        if isinstance(other, Determinant):
+            return
+
+        for ind, func in enumerate(other.funcs[:len(self.funcs)]):
             self.update_formula(ind, func)
 
 
-class Parallel(Nomograph):
-    index_of_func = [(0, 0), (1, 0), (2, 0)]
+# Unit normals to a curve from its derivatives, along with its points
+def tick_normals(px, py, dxdt, dydt):
+    angle = np.arctan2(-dxdt, dydt)
+    return px, py, np.cos(angle), np.sin(angle)
+
+
+# Distance from the points (px, py) to the segments going from (ax, ay) to (bx, by)
+def segment_distance(px, py, ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+    length = dx*dx + dy*dy
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = np.where(length > 0, ((px - ax)*dx + (py - ay)*dy) / length, 0)
+    u = np.clip(u, 0, 1)
+
+    return np.hypot(px - (ax + u*dx), py - (ay + u*dy))
+
+
+# Finds the scale (sx, sy) and translation (tx, ty) moving what is drawn with the old
+# transformation to where the new one draws it, or None if new is not old followed by
+# an axis aligned scale and a translation
+def scale_translation(old, new):
+    try:
+        delta = np.linalg.solve(old, new)
+    except np.linalg.LinAlgError:
+        return None
+
+    if delta[2, 2] == 0:
+        return None
+    delta = delta / delta[2, 2]
+
+    tolerance = 1e-9 * np.abs(delta).max()
+    if max(abs(delta[0, 1]), abs(delta[1, 0]), abs(delta[0, 2]), abs(delta[1, 2])) > tolerance:
+        return None
+
+    return delta[0, 0], delta[1, 1], delta[2, 0], delta[2, 1]
+
+
+# Splits a sampled curve where it is not finite (e.g. around a pole) into polylines
+def split_finite(ts, points):
+    is_finite = np.isfinite(points).all(axis=1)
+    if is_finite.all():
+        return [ts], [points]
+
+    # Runs of finite points start where the mask goes up and stop where it goes down
+    edges = np.diff(np.concatenate(([0], is_finite.astype(np.int8), [0])))
+    starts = np.nonzero(edges == 1)[0]
+    stops = np.nonzero(edges == -1)[0]
+
+    runs = [(start, stop) for start, stop in zip(starts, stops) if stop - start > 1]
+    return [ts[start:stop] for start, stop in runs], [points[start:stop] for start, stop in runs]
+
+
+# Finds the first u of the grid's range where a . r(u) = 0 for every row of a (N, 3), r being
+# the homogeneous points of the kernel, already evaluated at the grid as grid_values (G, 3)
+# Brackets the roots between the grid points then refines them with Newton, falling back
+# to bisection whenever a step leaves the bracket, NaN where the grid has no sign change nor root
+def solve_linear_row(kernel, a, grid, grid_values, tolerance, max_iterations):
+    # The sign also changes across a pole of the scale, so skip the intervals touching one
+    is_finite = np.isfinite(grid_values).all(axis=1)
+    valid = is_finite[:-1] & is_finite[1:]
+
+    # A root exactly on a grid point brackets both intervals around it, as the sign may not change
+    # across it (e.g. on an end of the range)
+    with np.errstate(all="ignore"):
+        values = a @ grid_values.T
+    positive = values > 0
+    zero = values == 0
+    crossing = ((positive[:, :-1] != positive[:, 1:]) | zero[:, :-1] | zero[:, 1:]) & valid
 
+    result = np.full(len(a), np.nan)
+    ind = crossing.argmax(axis=1)
+    active = np.nonzero(crossing[np.arange(len(a)), ind])[0]
+    ind = ind[active]
+
+    lo, hi = grid[ind], grid[ind + 1]
+    a = a[active]
+    g_lo = np.einsum("ij,ij->i", a, grid_values[ind])
+    g_hi = np.einsum("ij,ij->i", a, grid_values[ind + 1])
+
+    # Start from the secant of the bracket, which is already close on smooth scales
+    with np.errstate(all="ignore"):
+        u = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+    u = np.where((u >= lo) & (u <= hi), u, (lo + hi) / 2)
+
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+
+        points, derivs = kernel(u)
+        with np.errstate(all="ignore"):
+            g_u = np.einsum("ij,ij->i", a, points)
+            step = g_u / np.einsum("ij,ij->i", a, derivs)
+
+        # Keep the root between lo and hi
+        same_side = np.sign(g_u) == np.sign(g_lo)
+        lo = np.where(same_side, u, lo)
+        g_lo = np.where(same_side, g_u, g_lo)
+        hi = np.where(same_side, hi, u)
+
+        new_u = u - step
+        new_u = np.where((new_u >= lo) & (new_u <= hi), new_u, (lo + hi) / 2)
+        new_u = np.where(g_u == 0, u, new_u)
+
+        done = (np.abs(new_u - u) <= tolerance) | (hi - lo <= tolerance)
+        result[active[done]] = new_u[done]
+
+        keep = ~done
+        active, a, lo, hi, g_lo, u = active[keep], a[keep], lo[keep], hi[keep], g_lo[keep], new_u[keep]
+
+    # Best estimate of the queries that did not converge
+    result[active] = u
+
+    return result
+
+
+# Distance from every point of a sequence to the closest of its neighbours in the sequence
+def neighbour_spacing(x, y):
+    if len(x) < 2:
+        return np.full(len(x), np.inf)
+
+    distances = np.hypot(np.diff(x), np.diff(y))
+    return np.fmin(np.concatenate(([np.inf], distances)), np.concatenate((distances, [np.inf])))
+
+
+def expand_bounds(bounds, margin):
+    x_min, y_min, x_max, y_max = bounds
+    return x_min - margin, y_min - margin, x_max + margin, y_max + margin
+
+
+# Whether the boxes of the segments going from a (N, 2) to b (N, 2) overlap the bounds
+def segments_in_bounds(a, b, bounds):
+    x_min, y_min, x_max, y_max = bounds
+    return (
+        (np.minimum(a[:, 0], b[:, 0]) <= x_max) & (np.maximum(a[:, 0], b[:, 0]) >= x_min) &
+        (np.minimum(a[:, 1], b[:, 1]) <= y_max) & (np.maximum(a[:, 1], b[:, 1]) >= y_min)
+    )
+
+
+# Splits a polyline into the runs of its segments that may cross the bounds
+def clip_polyline(ts, points, bounds):
+    keep = segments_in_bounds(points[:-1], points[1:], bounds)
+    if keep.all():
+        return [ts], [points]
+
+    # A run of segments from start to stop covers the points from start to stop included
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+    starts = np.nonzero(edges == 1)[0]
+    stops = np.nonzero(edges == -1)[0]
+
+    return [ts[start:stop + 1] for start, stop in zip(starts, stops)], [points[start:stop + 1] for start, stop in zip(starts, stops)]
+
+
+# Geometry of one scale: its curve(s) on the screen, its tick segments and its labels
+class ScaleGeometry():
+    def __init__(self, row, curves, curve_ts, ticks, tick_major, labels, texts, label_normals=None):
+        self.row = row
+
+        # Polylines (N, 2) and the value of t at each of their points
+        self.curves = curves
+        self.curve_ts = curve_ts
+
+        # Tick segments (M, 2, 2) and whether each of them is a major tick
+        self.ticks = ticks
+        self.tick_major = tick_major
+
+        # Label positions (K, 2), their text and the unit normals (K, 2) they are placed along
+        self.labels = labels
+        self.texts = texts
+        self.label_normals = np.zeros_like(labels) if label_normals is None else label_normals
+
+
+# Array-backed list of everything to draw for a nomograph, so it can be rendered in bulk
+# (or exported/inspected) without going through one callback per segment
+class DrawList():
+    def __init__(self, name, scales):
+        self.name = name
+        self.scales = scales
+
+        self.curves = [curve for scale in scales for curve in scale.curves]
+        self.curve_rows = [scale.row for scale in scales for _ in scale.curves]
+
+        self.ticks = np.concatenate([scale.ticks for scale in scales] + [np.empty((0, 2, 2))])
+        self.tick_rows = np.concatenate([np.full(len(scale.ticks), scale.row) for scale in scales] + [np.empty(0, dtype=int)])
+        self.tick_major = np.concatenate([scale.tick_major for scale in scales] + [np.empty(0, dtype=bool)])
+
+        self.labels = np.concatenate([scale.labels for scale in scales] + [np.empty((0, 2))])
+        self.label_rows = np.concatenate([np.full(len(scale.labels), scale.row) for scale in scales] + [np.empty(0, dtype=int)])
+        self.texts = [text for scale in scales for text in scale.texts]
+        self.label_normals = np.concatenate([scale.label_normals for scale in scales] + [np.empty((0, 2))])
+
+
+# Compiled numpy function of one homogeneous row (X, Y, W) of the base matrix
+# The transformation is applied afterwards, so panning or zooming never recompiles
+# X, Y, W and their derivatives are fused in a single function with their common
+# subexpressions computed once, e.g. f(t) is evaluated once for f/(1+f) and its derivative
+class RowKernel():
+    def __init__(self, t, row):
+        self.key = tuple(row)
+        exprs = [sp.sympify(expr) for expr in self.key]
+
+        # Loaded from the source generated by a previous run when possible
+        cache_key = KernelCache.get_key(f"row {sp.srepr(t)} " + " ".join(sp.srepr(expr) for expr in exprs))
+        with Trace.span("load_kernel"):
+            self.func = KernelCache.cache.load(cache_key)
+        if self.func is not None:
+            return
+
+        Trace.count("kernels_compiled")
+        with Trace.span("differentiate"):
+            exprs += [sp.diff(expr, t) for expr in exprs]
+        with Trace.span("lambdify"):
+            self.func = sp.lambdify(t, exprs, "numpy", cse=True)
+        KernelCache.cache.store(cache_key, self.func)
+
+    # Evaluates the homogeneous points (N, 3) and their derivatives (N, 3) at every t
+    def __call__(self, ts):
+        ts = np.asarray(ts, dtype=float)
+
+        # Constant expressions return scalars, so broadcast everything to the shape of ts
+        with np.errstate(all="ignore"):
+            values = np.stack([np.broadcast_to(np.asarray(value, dtype=float), ts.shape) for value in self.func(ts)], axis=-1)
+
+        return values[..., :3], values[..., 3:]
+
+
+# Kernels shared by every nomograph of the process, keyed on the expressions of their row
+@functools.lru_cache(maxsize=1024)
+def compile_row(t, key):
+    return RowKernel(t, key)
+
+
+# Compiled numpy function of many rows, each in its own parameter, so all the scales of a
+# chart are evaluated in a single call with their common subexpressions computed once
+class RowsKernel():
+    def __init__(self, t, rows):
+        self.key = tuple(tuple(row) for row in rows)
+        rows = [[sp.sympify(expr) for expr in row] for row in self.key]
+
+        cache_key = KernelCache.get_key(
+            f"rows {sp.srepr(t)} " + " ; ".join(" ".join(sp.srepr(expr) for expr in row) for row in rows)
+        )
+        with Trace.span("load_kernel"):
+            self.func = KernelCache.cache.load(cache_key)
+        if self.func is not None:
+            return
+
+        Trace.count("kernels_compiled")
+        symbols = sp.symbols(f"t0:{len(self.key)}")
+        with Trace.span("differentiate"):
+            exprs = []
+            for symbol, row_exprs in zip(symbols, rows):
+                row_exprs = row_exprs + [sp.diff(expr, t) for expr in row_exprs]
+                exprs += [expr.subs(t, symbol) for expr in row_exprs]
+        with Trace.span("lambdify"):
+            self.func = sp.lambdify(symbols, exprs, "numpy", cse=True)
+        KernelCache.cache.store(cache_key, self.func)
+
+    # Evaluates the homogeneous points (R, N, 3) and their derivatives (R, N, 3) of every row at its ts (R, N)
+    def __call__(self, ts):
+        ts = np.asarray(ts, dtype=float)
+
+        with np.errstate(all="ignore"):
+            values = [np.broadcast_to(np.asarray(value, dtype=float), ts.shape[1:]) for value in self.func(*ts)]
+        values = np.stack(values).reshape(len(ts), 6, -1).transpose(0, 2, 1)
+
+        return values[..., :3], values[..., 3:]
+
+
+@functools.lru_cache(maxsize=64)
+def compile_rows(t, keys):
+    return RowsKernel(t, keys)
+
+
+class Parallel(Nomograph):
     def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
         super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
 
         if not(other is None):
             self.copy(other)
 
-        self.base_matrix = sp.Matrix([
-            [self.funcs[0], 0, 1],
-            [self.funcs[1], 1, 1],
-            [0.5*self.funcs[2], 0.5, 1]
-        ])
+        self.base_matrix = self.build_base(self.funcs)
 
         self.transform()
 
-    def update_formula(self, index, func):
-        super().update_formula(index, func)
+    def build_base(self, funcs):
+        return sp.Matrix([
+            [funcs[0], 0, 1],
+            [funcs[1], 1, 1],
+            [0.5*funcs[2], 0.5, 1]
+        ])
 
-        if index != 2:
-            self.base_matrix[Parallel.index_of_func[index]] = self.funcs[index]
 
-        else:
-            self.base_matrix[Parallel.index_of_func[index]] = 0.5*self.funcs[index]
+class Z_Chart(Nomograph):
+    def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
+        super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
+
+        if not(other is None):
+            self.copy(other)
+
+        self.base_matrix = self.build_base(self.funcs)
 
         self.transform()
 
+    def build_base(self, funcs):
+        return sp.Matrix([
+            [0, funcs[0], 1],
+            [funcs[1] / (1+funcs[1]), 0, 1],
+            [1, -funcs[2], 1]
+        ])
 
-class Z_Chart(Nomograph):
+
+class Concurrent(Nomograph):
     def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
         super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
 
         if not(other is None):
             self.copy(other)
 
-        self.base_matrix = sp.Matrix([
-            [0, self.funcs[0], 1],
-            [self.funcs[1] / (1+self.funcs[1]), 0, 1],
-            [1, -self.funcs[2], 1]
-        ])
+        self.base_matrix = self.build_base(self.funcs)
 
         self.transform()
 
-    def update_formula(self, index, func):
-        super().update_formula(index, func)
+    def build_base(self, funcs):
+        return sp.Matrix([
+            [funcs[0], 0, 1],
+            [funcs[1], funcs[1], 1],
+            [0, funcs[2], 1]
+        ])
 
-        if index == 0:
-            self.base_matrix[0, 1] = self.funcs[index]
-        elif index == 1:
-            self.base_matrix[1, 0] = self.funcs[index] / (1+self.funcs[index])
-        elif index == 2:
-            self.base_matrix[2, 1] = -1*self.funcs[index]
+
+# Sum of any number of functions, F1(u1) + ... + Fn(un) = 0, as a chain of parallel charts
+# The partial sums S1 = F1 + F2, S2 = S1 + F3, ... lie on ungraduated turning axes, each one
+# being on the line of an isopleth through the previous one and the next scale, the last partial
+# sum being -Fn. Each scale or axis is an horizontal line showing its value v at x = c * v
+class N_Parallel(Nomograph):
+    def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
+        super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
+        self.batch_rows = True
+
+        self.scales, self.axes = self.get_layout(len(self.funcs))
+
+        if not(other is None):
+            self.copy(other)
+
+        self.base_matrix = self.build_base(self.funcs)
+        self.row_variables = list(range(self.variables)) + [None] * len(self.axes)
 
         self.transform()
 
-class Concurrent(Nomograph):
+    # Lines (y, c) of the scales and of the turning axes, every variable having the same unit
+    @staticmethod
+    def get_layout(count):
+        scales = [(0, 1), (1, 1)]
+        axes = []
+        lines = [0, 1]
+
+        # The first partial sum is halfway between the first two scales
+        axis_y, axis_c = 0.5, 0.5
+        for _ in range(2, count - 1):
+            axes.append((axis_y, axis_c))
+            lines.append(axis_y)
+
+            # The next scale goes on the first line after the others whose partial sum lands on no other line,
+            # the isopleth through S at axis_y and F at y crossing the next axis at (axis_y + axis_c*y) / (1 + axis_c)
+            y = max(lines) + 1
+            while True:
+                next_y = (axis_y + axis_c*y) / (1 + axis_c)
+                if all(abs(next_y - line) > 0.25 for line in lines + [y]):
+                    break
+                y += 1
+
+            scales.append((y, 1))
+            lines.append(y)
+            axis_y, axis_c = next_y, axis_c / (1 + axis_c)
+
+        scales.append((axis_y, -axis_c))
+        return scales, axes
+
+    def build_base(self, funcs):
+        t = self.t
+        return sp.Matrix(
+            [[c*func, y, 1] for func, (y, c) in zip(funcs, self.scales)] +
+            [[c*t, y, 1] for y, c in self.axes]
+        )
+
+    # The partial sums go from the sum of the minimums to the sum of the maximums of the functions
+    def update_axis_ranges(self):
+        lows, highs = [], []
+        for row, (_, c) in enumerate(self.scales[:-1]):
+            values = self.sample_row(row)[:, 0] / c
+            lows.append(np.nanmin(values))
+            highs.append(np.nanmax(values))
+
+        for ind in range(len(self.axes)):
+            row = len(self.scales) + ind
+            self.axis_ranges[row] = Ticks(sum(lows[:ind + 2]), sum(highs[:ind + 2]), 0, 0)
+
+
+# F1(u1) / F2(u2) = F3(u3) / F4(u4), as two Z charts sharing their diagonal turning axis
+# F1 and F3 go up and down the left line, F2 and F4 down and up the right one, so the isopleth
+# through F1 and F2 crosses the axis where the one through F3 and F4 does, at F1 / (F1 + F2)
+class Proportional(Nomograph):
     def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
         super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
+        self.batch_rows = True
 
         if not(other is None):
             self.copy(other)
 
-        self.base_matrix = sp.Matrix([
-            [self.funcs[0], 0, 1],
-            [self.funcs[1], self.funcs[1], 1],
-            [0, self.funcs[2], 1]
-        ])
+        self.base_matrix = self.build_base(self.funcs)
+        self.row_variables = [0, 1, 2, 3, None]
 
         self.transform()
 
-    def update_formula(self, index, func):
-        super().update_formula(index, func)
+    def build_base(self, funcs):
+        return sp.Matrix([
+            [0, funcs[0], 1],
+            [1, -funcs[1], 1],
+            [0, -funcs[2], 1],
+            [1, funcs[3], 1],
+            [self.t, 0, 1]
+        ])
+
+    # The axis covers where both pairs of scales can cross it
+    def update_axis_ranges(self):
+        values = [self.sample_row(row)[:, 1] for row in range(4)]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            first = values[0][:, None] / (values[0][:, None] - values[1][None, :])
+            second = values[2][:, None] / (values[2][:, None] - values[3][None, :])
+        crossings = np.concatenate((first.ravel(), second.ravel()))
+        crossings = crossings[np.isfinite(crossings)]
+
+        if len(crossings) == 0:
+            crossings = np.array([0.0, 1.0])
+        self.axis_ranges[4] = Ticks(crossings.min(), crossings.max(), 0, 0)
 
-        if index == 0:
-            self.base_matrix[0, 0] = self.funcs[index]
-        elif index == 1:
-            self.base_matrix[1, 0] = self.funcs[index]
-            self.base_matrix[1, 1] = self.funcs[index]
-        elif index == 2:
-            self.base_matrix[2, 1] = self.funcs[index]
+
+# F1(u) and F2(u) side by side, the left line showing u at the height F1(u) and the right line at F2(u),
+# so an horizontal isopleth converts between them
+class Ladder(Nomograph):
+    def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
+        super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
+
+        if not(other is None):
+            self.copy(other)
+
+        self.base_matrix = self.build_base(self.funcs)
+        self.row_variables = [0, 0]
 
         self.transform()
 
+    def build_base(self, funcs):
+        return sp.Matrix([
+            [0, funcs[0], 1],
+            [1, funcs[1], 1]
+        ])
 
-class Ticks():
-    def __init__(self, minimum, maximum, maj_tick, min_tick, is_log=False):
-        self.min = minimum
-        self.max = maximum
-        self.maj_tick = maj_tick
-        self.min_tick = min_tick
-        self.is_log = is_log
 
-    def get_maj_ticks(self):
-        if not self.is_log and self.maj_tick <= 0:
-            return np.array([])
-        elif self.is_log and self.maj_tick <= 1:
-            return np.array([])
+# Any determinant nomograph, the function i being the element (i // 3, i % 3) of the base matrix
+# Every row must only depend on the variable of its scale
+class Determinant(Nomograph):
+    # Parallel scales until other functions are given
+    DEFAULT_FUNCS = ["t", "0", "1", "t", "1", "1", "t/2", "1/2", "1"]
 
-        temp = self.min
+    def __init__(self, name, func_vars, *, other=None, funcs=None, ranges=None):
+        if funcs is None:
+            funcs = Determinant.DEFAULT_FUNCS
+        super().__init__(name=name, func_vars=func_vars, funcs=funcs, ranges=ranges)
 
-        ticks = []
-        while temp < self.max:
-            ticks.append(temp)
+        if not(other is None):
+            self.copy(other)
 
-            if not self.is_log:
-                temp += self.maj_tick
-            else:
-                temp *= self.maj_tick
+        self.base_matrix = self.build_base(self.funcs)
 
-        ticks.append(self.max)
+        self.transform()
 
-        return np.array(ticks)
+    def build_base(self, funcs):
+        return sp.Matrix(3, 3, funcs)
 
-    def get_min_ticks(self, major_ticks=None):
-        if not self.is_log and self.min_tick <= 0:
+    def set_base_matrix(self, base):
+        super().set_base_matrix(base)
+        self.funcs = list(self.base_matrix)
+
+    # Takes the base matrix of the other nomograph, so switching to a determinant keeps the same chart
+    # The charts of more or less than three rows keep the default functions
+    def copy_funcs(self, other):
+        if other.base_matrix.shape == (3, 3):
+            self.funcs = list(other.base_matrix)
+
+
+# Chart types that can be built from their name in Types.json
+chart_types = {
+    "Parallel": Parallel,
+    "N or Z": Z_Chart,
+    "Concurrent": Concurrent,
+    "General": Determinant,
+    "N Parallel": N_Parallel,
+    "Proportional": Proportional,
+    "Ladder": Ladder
+}
+
+
+# Most ticks of one step in a range, a step giving more (e.g. 1e-7 over 1e5) gives no ticks at all
+# as they could never be told apart on the screen
+MAX_TICKS = 1 << 21
+# Bytes of tick arrays kept by each of the tick caches
+TICK_CACHE_BYTES = 64 * 1024 * 1024
+
+
+# Least recently used cache of functions returning arrays (or tuples of arrays), bounded by the
+# bytes of the arrays it keeps rather than by their number, as a range can have millions of ticks
+def array_cache(max_bytes):
+    def decorator(func):
+        entries = collections.OrderedDict()
+        lock = threading.Lock()
+        total = 0
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            nonlocal total
+            with lock:
+                if args in entries:
+                    entries.move_to_end(args)
+                    return entries[args][0]
+
+            result = func(*args)
+            arrays = result if isinstance(result, tuple) else (result,)
+            size = sum(array.nbytes for array in arrays)
+
+            with lock:
+                if args not in entries and size <= max_bytes:
+                    entries[args] = (result, size)
+                    total += size
+                    while total > max_bytes:
+                        total -= entries.popitem(last=False)[1][1]
+
+            return result
+
+        def cache_clear():
+            nonlocal total
+            with lock:
+                entries.clear()
+                total = 0
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+# Values from minimum to maximum every step (or every factor of step for log scales)
+# Always ends on maximum, dropping the value that lands within float error of it
+@array_cache(TICK_CACHE_BYTES)
+def tick_values(minimum, maximum, step, is_log):
+    if not is_log:
+        if step <= 0 or (maximum - minimum) / step > MAX_TICKS:
             return np.array([])
-        elif self.is_log and self.min_tick <= 1:
+
+        positions = np.arange(np.floor((maximum - minimum) / step) + 1)
+        ticks = minimum + step*positions
+        ticks = ticks[ticks < maximum - 1e-9*step]
+    else:
+        if step <= 1 or minimum <= 0 or np.log(maximum / minimum) / np.log(step) > MAX_TICKS:
             return np.array([])
 
-        if major_ticks is None:
-            major_ticks = []
+        positions = np.arange(np.floor(np.log(maximum / minimum) / np.log(step)) + 1)
+        ticks = minimum * step**positions
+        ticks = ticks[ticks < maximum / step**1e-9]
 
-        temp = self.min
+    ticks = np.append(ticks, maximum)
+    ticks.flags.writeable = False
 
-        ticks = []
-        while temp < self.max:
-            if temp not in major_ticks:
-                ticks.append(temp)
+    return ticks
 
-            if not self.is_log:
-                temp += self.min_tick
-            else:
-                temp *= self.min_tick
 
-        ticks.append(self.max)
+# Removes the values that are within tolerance of any of the sorted others
+def remove_near(values, others, tolerance):
+    if len(values) == 0 or len(others) == 0:
+        return values
+
+    if len(others) == 1:
+        distance = np.abs(values - others[0])
+    else:
+        ind = np.clip(np.searchsorted(others, values), 1, len(others) - 1)
+        distance = np.minimum(np.abs(values - others[ind - 1]), np.abs(values - others[ind]))
 
-        return np.array(ticks)
+    return values[distance > tolerance]
+
+
+# Removes the minor ticks falling on one of the sorted major ticks, as a read-only array
+def remove_majors(minor_ticks, major_ticks, min_tick, is_log):
+    # Compare log scales in log space, so the tolerance is relative to the minor step
+    if not is_log:
+        minor_ticks = remove_near(minor_ticks, major_ticks, 1e-6*min_tick)
+    elif len(minor_ticks) > 0 and len(major_ticks) > 0:
+        minor_ticks = np.exp(remove_near(np.log(minor_ticks), np.log(major_ticks), 1e-6*np.log(min_tick)))
+
+    # Shared by the caches, it must not be modified in place
+    minor_ticks.flags.writeable = False
+
+    return minor_ticks
+
+
+# Major and minor ticks of a range, the minor ticks falling on a major one being removed
+@array_cache(TICK_CACHE_BYTES)
+def tick_arrays(minimum, maximum, maj_tick, min_tick, is_log):
+    major_ticks = tick_values(minimum, maximum, maj_tick, is_log)
+    minor_ticks = tick_values(minimum, maximum, min_tick, is_log)
+
+    return major_ticks, remove_majors(minor_ticks, major_ticks, min_tick, is_log)
+
+
+class Ticks():
+    def __init__(self, minimum, maximum, maj_tick, min_tick, is_log=False):
+        self.min = minimum
+        self.max = maximum
+        self.maj_tick = maj_tick
+        self.min_tick = min_tick
+        self.is_log = is_log
+
+    def get_maj_ticks(self):
+        return tick_values(self.min, self.max, self.maj_tick, self.is_log)
+
+    # Every minor tick, or only the ones not falling on one of the given major ticks
+    def get_min_ticks(self, major_ticks=None):
+        minor_ticks = tick_values(self.min, self.max, self.min_tick, self.is_log)
+        if major_ticks is None:
+            return minor_ticks
+
+        return remove_majors(minor_ticks, np.sort(np.asarray(major_ticks, dtype=float)), self.min_tick, self.is_log)
 
     def get_ticks(self):
-        major_ticks = self.get_maj_ticks()
-        minor_ticks = self.get_min_ticks(major_ticks)
+        return tick_arrays(self.min, self.max, self.maj_tick, self.min_tick, self.is_log)
 
-        return major_ticks, minor_ticks
+    # Everything the ticks depend on, to know if they changed
+    def get_state(self):
+        return (self.min, self.max, self.maj_tick, self.min_tick, self.is_log)
+
+    # Text of the label of a tick
+    def label(self, value):
+        if not self.is_log:
+            return f"{value:.2f}"
+        return f"{value:g}"
 
     def set_max(self, new_max):
         self.max = max(self.min, new_max)
         return self.max
 
     def set_min(self, new_min):
+        # A log scale cannot reach 0
+        if self.is_log and new_min <= 0:
+            return self.min
+
         self.min = min(self.max, new_min)
         return self.min
 
@@ -465,3 +1361,17 @@ class Ticks():
         else:
             self.min_tick = max(new_val, 1)
         return self.min_tick
+
+    # Switches between linear and log ticks, moving the range and steps to valid values
+    def set_log(self, is_log):
+        self.is_log = is_log
+        if not is_log:
+            return
+
+        if self.min <= 0:
+            self.min = min(1, self.max) if self.max > 0 else 1
+            self.max = max(self.min, self.max)
+        if self.maj_tick <= 1:
+            self.maj_tick = 10
+        if self.min_tick <= 1:
+            self.min_tick = 2
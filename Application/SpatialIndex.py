@@ -0,0 +1,126 @@
+import numpy as np
+
+import Trace
+
+# Side (in pixels) of the cells of the grids, the segments are split to be at most this long
+CELL_SIZE = 16
+
+
+# Distances from (px, py) to the segments going from a (M, 2) to b (M, 2), and where along them
+# (0 at a, 1 at b) the closest points are
+def project_segments(px, py, a, b):
+    d = b - a
+    length = (d*d).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = np.where(length > 0, ((px - a[:, 0])*d[:, 0] + (py - a[:, 1])*d[:, 1]) / length, 0)
+    u = np.clip(u, 0, 1)
+
+    return np.hypot(px - (a[:, 0] + u*d[:, 0]), py - (a[:, 1] + u*d[:, 1])), u
+
+
+# Uniform grid over the sampled polylines of one scale, mapping a point to the nearest value of t
+class ScaleIndex():
+    def __init__(self, scale, cell_size=CELL_SIZE):
+        self.row = scale.row
+        self.scale = scale
+        self.cell_size = cell_size
+
+        starts = [curve[:-1] for curve in scale.curves] + [np.empty((0, 2))]
+        ends = [curve[1:] for curve in scale.curves] + [np.empty((0, 2))]
+        start_ts = [ts[:-1] for ts in scale.curve_ts] + [np.empty(0)]
+        end_ts = [ts[1:] for ts in scale.curve_ts] + [np.empty(0)]
+        a, b = np.concatenate(starts), np.concatenate(ends)
+        ta, tb = np.concatenate(start_ts), np.concatenate(end_ts)
+
+        # Split the long segments (e.g. a straight scale is a single one) into pieces of at most a cell
+        pieces = np.maximum(np.ceil(np.hypot(*(b - a).T) / cell_size), 1).astype(int)
+        segment = np.repeat(np.arange(len(a)), pieces)
+        first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        u0 = (np.arange(len(segment)) - first) / pieces[segment]
+        u1 = u0 + 1 / pieces[segment]
+
+        self.a = a[segment] + u0[:, None]*(b - a)[segment]
+        self.b = a[segment] + u1[:, None]*(b - a)[segment]
+        self.ta = ta[segment] + u0*(tb - ta)[segment]
+        self.tb = ta[segment] + u1*(tb - ta)[segment]
+
+        # Pieces sorted by the cell of their middle, every cell being a slice of them
+        cells = np.floor((self.a + self.b) / (2*cell_size)).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        self.a, self.b, self.ta, self.tb = self.a[order], self.b[order], self.ta[order], self.tb[order]
+        cells = cells[order]
+
+        unique, starts, counts = np.unique(cells, axis=0, return_index=True, return_counts=True)
+        self.cells = {
+            (i, j): (start, start + count) for (i, j), start, count in zip(unique.tolist(), starts.tolist(), counts.tolist())
+        }
+
+    # Gets (distance, t) of the closest point within max_distance of (x, y), or None
+    def nearest(self, x, y, max_distance):
+        # A piece is within half a cell of its middle, so only the cells around the point can hold it
+        reach = max_distance + self.cell_size / 2
+        i_min, i_max = int(np.floor((x - reach) / self.cell_size)), int(np.floor((x + reach) / self.cell_size))
+        j_min, j_max = int(np.floor((y - reach) / self.cell_size)), int(np.floor((y + reach) / self.cell_size))
+
+        slices = [
+            self.cells[(i, j)] for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1) if (i, j) in self.cells
+        ]
+        if not slices:
+            return None
+
+        candidates = np.concatenate([np.arange(start, stop) for start, stop in slices])
+        distances, u = project_segments(x, y, self.a[candidates], self.b[candidates])
+
+        best = distances.argmin()
+        if distances[best] > max_distance:
+            return None
+
+        piece = candidates[best]
+        return distances[best], self.ta[piece] + u[best]*(self.tb[piece] - self.ta[piece])
+
+
+# Indexes of the scales of the drawn nomograph, built the first time a scale is looked up and
+# only rebuilt when the geometry of that scale changes
+class SpatialIndex():
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+
+        self.scales = {}
+        self.indexes = {}
+
+        # Transformation the indexed geometry was computed with
+        self.matrix = np.identity(3)
+
+    # Uses the scales of a draw list computed with the given transformation
+    def update(self, draw_list, matrix):
+        self.scales = {scale.row: scale for scale in draw_list.scales}
+        self.indexes = {row: index for row, index in self.indexes.items() if self.scales.get(row) is index.scale}
+        self.matrix = np.array(matrix, dtype=float)
+
+    def get_index(self, row):
+        index = self.indexes.get(row)
+        if index is None:
+            with Trace.span("build_index", row=row):
+                index = ScaleIndex(self.scales[row], self.cell_size)
+            self.indexes[row] = index
+
+        return index
+
+    # Gets (row, t, distance) of the scale closest to the screen point (x, y), or None if there
+    # is none within max_distance, matrix being the transformation the screen currently shows
+    # (the canvas items may have been moved or scaled since they were indexed)
+    def nearest(self, x, y, matrix=None, max_distance=10):
+        if matrix is not None:
+            point = np.array([x, y, 1.0]) @ np.linalg.solve(matrix, self.matrix)
+            if point[2] == 0:
+                return None
+            x, y = point[0] / point[2], point[1] / point[2]
+
+        best = None
+        for row in self.scales:
+            hit = self.get_index(row).nearest(x, y, max_distance)
+            if hit is not None and (best is None or hit[0] < best[2]):
+                best = (row, hit[1], hit[0])
+
+        return best
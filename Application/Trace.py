@@ -0,0 +1,108 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+# Opt-in timing spans and counters of the nomograph pipeline, exported as Chrome trace events
+# (chrome://tracing or https://ui.perfetto.dev). Setting NOMOGRAPH_TRACE to a path enables it
+# at import and writes the trace there at exit. When disabled, spans and counters do nothing.
+enabled = False
+events = []
+counters = {}
+
+
+def now():
+    return time.perf_counter() * 1e6
+
+
+# Span doing nothing, returned while tracing is disabled
+class NullSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+# Timing of a block, recorded as a complete event so nested spans show up nested
+class Span():
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, *args):
+        events.append({
+            "name": self.name,
+            "ph": "X",
+            "ts": self.start,
+            "dur": now() - self.start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": self.args
+        })
+
+
+def span(name, **args):
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+# Decorates a function so every call is a span
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+
+            with Span(name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Adds to a counter (points sampled, items created, cache hits...)
+def count(name, value=1):
+    if not enabled:
+        return
+
+    counters[name] = counters.get(name, 0) + value
+    events.append({"name": name, "ph": "C", "ts": now(), "pid": os.getpid(), "args": {name: counters[name]}})
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    events.clear()
+    counters.clear()
+
+
+# Writes the recorded events in the Chrome trace event format
+def export(path):
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": counters}}, file)
+
+
+if os.environ.get("NOMOGRAPH_TRACE"):
+    enable()
+    atexit.register(export, os.environ["NOMOGRAPH_TRACE"])
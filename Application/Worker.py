@@ -0,0 +1,60 @@
+import queue
+import threading
+
+import Trace
+
+
+# Runs jobs (e.g. the symbolic parsing and compilation) on a background thread
+# Every job has a key and a request id, only the result of the latest job of a key is kept
+class Worker():
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+
+        self.latest = {}
+        self.next_id = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Queues func(*args), superseding the previous jobs of the same key
+    def submit(self, key, func, *args):
+        self.next_id += 1
+        self.latest[key] = self.next_id
+        self.jobs.put((key, self.next_id, func, args))
+
+        return self.next_id
+
+    def run(self):
+        while True:
+            key, request_id, func, args = self.jobs.get()
+
+            # Skip the jobs that were superseded while waiting
+            if self.latest.get(key) != request_id:
+                continue
+
+            try:
+                with Trace.span("job", key=str(key)):
+                    result = func(*args)
+                error = None
+            except Exception as exception:
+                result = None
+                error = exception
+
+            self.results.put((key, request_id, result, error))
+
+    # Gets the (key, result, error) of the finished jobs, discarding the stale ones
+    # Must be called from the thread that submits the jobs
+    def poll(self):
+        finished = []
+        while True:
+            try:
+                key, request_id, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            if self.latest.get(key) == request_id:
+                del self.latest[key]
+                finished.append((key, result, error))
+
+        return finished
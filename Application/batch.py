@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import Export
+import Layout
+import Nomograph
+
+# Transformations a spec can apply, in order, e.g. ["rotate", {"deg": 30}] or ["translate", 50, 50]
+TRANSFORMS = ("scale", "scale_at_point", "translate", "rotate", "rotate_point", "shear", "flip", "project")
+
+
+def load_types(path):
+    with open(path, "r") as file:
+        data = json.load(file)
+    return {t["name"]: t for t in data["types"]}
+
+
+# Gets the chart specs of a file, either a single spec, a list of specs or {"charts": [...]}
+def load_specs(path):
+    with open(path, "r") as file:
+        data = json.load(file)
+
+    if isinstance(data, dict):
+        data = data.get("charts", [data])
+    return data
+
+
+# Builds the nomograph described by a spec, e.g.
+# {"type": "N or Z", "funcs": ["t", "t**2", "t"], "ranges": [[0, 1, 0.25, 0.05], ...],
+#  "transform": [["scale", 100, 100]], "output": "z_chart.svg"}
+# "layout": {"page": [800, 600], "margin": 20} searches the best layout first, the transformations
+# then apply on top of it
+def build_chart(spec, types):
+    name = spec["type"]
+    if name not in Nomograph.chart_types:
+        raise ValueError(f"Unsupported chart type: {name}")
+
+    chart_type = Nomograph.chart_types[name]
+    func_vars = types[name]["functions"]
+    # Without functions, the chart type uses its default ones
+    funcs = spec.get("funcs")
+
+    # A type with "variables": -1 takes one variable per function of the spec
+    if types[name].get("variables") == -1 and funcs is not None:
+        func_vars = list(range(len(funcs)))
+    nomograph = chart_type(name=chart_type.__name__.lower(), func_vars=func_vars, funcs=funcs)
+
+    # A range is [min, max] optionally followed by the major step, minor step and whether it is log
+    for ticks, value_range in zip(nomograph.value_ranges, spec.get("ranges", [])):
+        if len(value_range) > 4:
+            ticks.set_log(bool(value_range[4]))
+        ticks.min, ticks.max = value_range[0], value_range[1]
+        if len(value_range) > 2:
+            ticks.set_major_tick(value_range[2])
+        if len(value_range) > 3:
+            ticks.set_minor_tick(value_range[3])
+
+    if "matrix" in spec:
+        nomograph.set_transform(spec["matrix"])
+        nomograph.execute_last_transform()
+
+    if "layout" in spec:
+        # Already in a worker process
+        layout = spec["layout"]
+        Layout.optimize(nomograph, tuple(layout.get("page", (800, 600))), layout.get("margin", 20), workers=1)
+
+    for transform in spec.get("transform", []):
+        if transform[0] not in TRANSFORMS:
+            raise ValueError(f"Unsupported transformation: {transform[0]}")
+
+        args = list(transform[1:])
+        kwargs = args.pop() if args and isinstance(args[-1], dict) else {}
+        getattr(nomograph, transform[0])(*args, **kwargs)
+        nomograph.execute_last_transform()
+
+    nomograph.transform()
+    return nomograph
+
+
+# Renders one chart to its file, runs in the worker processes, each keeping its own compile cache
+# Returns the error instead of raising it, so one bad spec does not stop rendering the others
+def render_chart(job):
+    spec, types, path = job
+    start = time.perf_counter()
+
+    try:
+        nomograph = build_chart(spec, types)
+        Export.export(nomograph, path, tick_size=spec.get("tick_size", 5))
+    except Exception as exception:
+        return path, time.perf_counter() - start, f"{type(exception).__name__}: {exception}"
+
+    return path, time.perf_counter() - start, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renders nomographs from JSON specs without any GUI")
+    parser.add_argument("specs", nargs="+", help="JSON files with one spec, a list of specs or {\"charts\": [...]}")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory of the outputs without an absolute path")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("-f", "--format", default="svg", help="format of the outputs not named in their spec")
+    parser.add_argument(
+        "--types", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Types.json"),
+        help="chart types definition"
+    )
+    args = parser.parse_args()
+
+    types = load_types(args.types)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = []
+    for spec_path in args.specs:
+        for spec in load_specs(spec_path):
+            output = spec.get("output", f"chart_{len(jobs)}.{args.format}")
+            jobs.append((spec, types, os.path.join(args.output_dir, output)))
+
+    start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        chunksize = max(1, len(jobs) // (4 * args.jobs))
+        for path, duration, error in executor.map(render_chart, jobs, chunksize=chunksize):
+            if error is not None:
+                failures += 1
+                print(f"{path} failed: {error}", file=sys.stderr)
+            else:
+                print(f"{path} ({duration * 1000:.1f} ms)")
+    elapsed = time.perf_counter() - start
+
+    rendered = len(jobs) - failures
+    print(f"Rendered {rendered} charts in {elapsed:.2f} s ({rendered / elapsed:.1f} charts/s) with {args.jobs} workers")
+    if failures:
+        print(f"{failures} of {len(jobs)} charts failed", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
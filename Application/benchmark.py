@@ -0,0 +1,235 @@
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import sympy as sp
+
+import Bounding
+import KernelCache
+import Nomograph
+
+# Formula sets used for every chart type, from trivial to expensive to evaluate
+FORMULA_SETS = {
+    "linear": ["t", "t", "t"],
+    "polynomial": ["t**3 - 2*t", "t**2 + 1", "3*t**4 - t"],
+    "rational": ["(t**2 + 1)/(t + 2)", "1/(1 + t)", "t/(t**2 + 3)"],
+    "transcendental": ["exp(-t)*sin(3*t) + log(1 + t**2)", "sqrt(1 + t)*cos(t)", "atan(t)*exp(t/4)"]
+}
+
+# Minor tick steps over [0, 10], i.e. about 10^2 to 10^5 ticks per scale
+RANGE_SIZES = {
+    "1e2": 0.1,
+    "1e3": 0.01,
+    "1e4": 0.001,
+    "1e5": 0.0001
+}
+
+CHART_TYPES = ("Parallel", "N or Z", "Concurrent")
+
+
+# Times func as the best and median of repeats, each averaging enough calls to last min_time
+def measure(func, repeat=5, min_time=0.05, track_memory=True):
+    func()
+
+    # Number of calls per repeat so a repeat lasts at least min_time
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or calls >= 1e6:
+            break
+        calls *= 10
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        times.append((time.perf_counter() - start) / calls)
+
+    result = {"calls": calls, "repeat": repeat, "best_s": min(times), "median_s": statistics.median(times)}
+
+    # Memory is measured on a separate call, tracemalloc slows everything down
+    if track_memory:
+        tracemalloc.start()
+        func()
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result
+
+
+def build(name, formulas, minor_step=0.05):
+    chart_type = Nomograph.chart_types[name]
+    nomograph = chart_type(name=chart_type.__name__.lower(), func_vars=[0, 1, 2], funcs=formulas, ranges=[(0.5, 10)] * 3)
+    for ticks in nomograph.value_ranges:
+        ticks.set_major_tick(1)
+        ticks.set_minor_tick(minor_step)
+
+    nomograph.scale(100, 100)
+    nomograph.execute_last_transform()
+    nomograph.transform()
+    return nomograph
+
+
+def clear_caches():
+    Nomograph.compile_row.cache_clear()
+    Nomograph.tick_arrays.cache_clear()
+    Nomograph.tick_values.cache_clear()
+
+
+def no_op(*args):
+    pass
+
+
+# Draws with the kernels compiled but every scale computed again, as after a transformation
+def draw_again(nomograph):
+    nomograph.clear_geometry()
+    nomograph.draw(no_op, no_op, 5)
+
+
+# Every benchmark as (name, params, func), the cold ones clear the caches on every call
+# The warm start ones keep their kernels in cache_dir, which the caller removes afterwards
+def get_benchmarks(cache_dir):
+    benchmarks = []
+
+    # The cold benchmarks compile everything (main runs them without cache), the warm start ones
+    # only use this cache
+    disk_cache = KernelCache.KernelCache(cache_dir)
+
+    for name in CHART_TYPES:
+        for set_name, formulas in FORMULA_SETS.items():
+            params = {"type": name, "formulas": set_name}
+
+            benchmarks.append(("construct", params, lambda name=name, formulas=formulas: build(name, formulas)))
+
+            # Cold draw: parse, differentiate and compile everything again
+            def draw_cold(name=name, formulas=formulas):
+                clear_caches()
+                build(name, formulas).draw(no_op, no_op, 5)
+
+            benchmarks.append(("draw_cold", params, draw_cold))
+
+            # Warm start: the kernels are loaded from the disk cache written by a previous run
+            def draw_disk_cache(name=name, formulas=formulas):
+                clear_caches()
+                with KernelCache.use(disk_cache):
+                    build(name, formulas).draw(no_op, no_op, 5)
+
+            benchmarks.append(("draw_disk_cache", params, draw_disk_cache))
+
+            nomograph = build(name, formulas)
+            benchmarks.append(("draw", params, lambda nomograph=nomograph: draw_again(nomograph)))
+
+        for size, step in RANGE_SIZES.items():
+            nomograph = build(name, FORMULA_SETS["polynomial"], step)
+            benchmarks.append((
+                "draw", {"type": name, "formulas": "polynomial", "ticks": size},
+                lambda nomograph=nomograph: draw_again(nomograph)
+            ))
+
+    # Editing one formula of a six scale chart, only its scale is computed again
+    chart_type = Nomograph.chart_types["N Parallel"]
+    nomograph = chart_type(name="n_parallel", func_vars=list(range(6)), funcs=FORMULA_SETS["polynomial"] * 2, ranges=[(0.5, 10)] * 6)
+    nomograph.scale(100, 100)
+    nomograph.execute_last_transform()
+    formulas = [sp.parse_expr(formula) for formula in FORMULA_SETS["rational"][:2]]
+
+    edits = itertools.count()
+
+    def edit_formula(nomograph=nomograph):
+        nomograph.update_formula(2, formulas[next(edits) % 2])
+        nomograph.draw(no_op, no_op, 5)
+
+    benchmarks.append(("edit_formula", {"type": "N Parallel", "scales": 6}, edit_formula))
+
+    nomograph = build("Parallel", FORMULA_SETS["linear"])
+
+    def transform(nomograph=nomograph):
+        nomograph.rotate_point(50, 50, deg=30)
+        nomograph.transform()
+
+    benchmarks.append(("transform", {}, transform))
+
+    for size in (10**3, 10**5, 10**6):
+        points = np.random.default_rng(0).uniform(1, 2, (size, 3))
+        derivs = np.random.default_rng(1).uniform(1, 2, (size, 3))
+        benchmarks.append((
+            "reduce", {"points": size},
+            lambda points=points, derivs=derivs, nomograph=nomograph: nomograph.reduce(points, derivs)
+        ))
+
+    for size in (10**3, 10**5):
+        points = np.random.default_rng(0).normal(size=(size, 2))
+        benchmarks.append((
+            "fit_to_page", {"points": size},
+            lambda points=points: Bounding.fit_matrices([Bounding.convex_hull(points)])
+        ))
+
+    point_sets = list(np.random.default_rng(0).normal(size=(1000, 100, 2)))
+    benchmarks.append((
+        "fit_to_page", {"charts": 1000, "points": 100},
+        lambda: Bounding.fit_matrices(Bounding.convex_hulls(point_sets))
+    ))
+
+    for size, step in list(RANGE_SIZES.items()) + [("1e6", 0.00001)]:
+        for is_log in (False, True):
+            ticks = Nomograph.Ticks(0.5, 10, 1, step, is_log)
+            if is_log:
+                # Same number of ticks over a decade, 9.5 / step of them
+                ticks = Nomograph.Ticks(1, 10, 10, 10 ** (step / 9.5), is_log)
+
+            def get_ticks_cold(ticks=ticks):
+                clear_caches()
+                ticks.get_ticks()
+
+            params = {"ticks": size, "is_log": is_log, "count": sum(len(values) for values in ticks.get_ticks())}
+            benchmarks.append(("get_ticks_cold", params, get_ticks_cold))
+            benchmarks.append(("get_ticks", params, ticks.get_ticks))
+
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the micro-benchmarks of the nomograph pipeline, without any display")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON file receiving the results")
+    parser.add_argument("-k", "--filter", default="", help="only run the benchmarks whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of timed repeats")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum duration of a repeat in seconds")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="nomograph_kernels_") as cache_dir, KernelCache.use(KernelCache.KernelCache("")):
+        for name, params, func in get_benchmarks(cache_dir):
+            if args.filter not in name:
+                continue
+
+            result = measure(func, repeat=args.repeat, min_time=args.min_time)
+            results.append({"name": name, "params": params, **result})
+
+            described = ", ".join(f"{key}={value}" for key, value in params.items())
+            print(f"{name:16} {described:50} {result['best_s'] * 1000:10.3f} ms {result['peak_bytes'] / 1e6:8.2f} MB")
+
+    report = {
+        "date": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sympy": sp.__version__,
+        "platform": platform.platform(),
+        "results": results
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
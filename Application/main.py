@@ -1,9 +1,60 @@
+import time
+
+# Startup timings are measured from here
+STARTED = time.perf_counter()
+
+import functools
 import json
 import tkinter as tk
 from tkinter import ttk
+from tkinter import filedialog
 from tkinter import messagebox
+from tkinter import font as tkfont
+
+import numpy as np
+
+import Bounding
+import Export
+import Labels
+import Layout
+import SpatialIndex
+import Trace
+import Worker
+
+# Nomograph imports sympy, most of the cold start, so the worker imports it once the window shows
+Nomograph = None
+
+
+def import_nomograph():
+    global Nomograph
+    import Nomograph
+
 
-import Nomograph
+# Runs on the worker at startup: imports Nomograph and compiles the default chart
+# Returns the chart, its kernels and how long the import took
+def load_default_nomograph():
+    start = time.perf_counter()
+    with Trace.span("import_nomograph"):
+        import_nomograph()
+    import_time = time.perf_counter() - start
+
+    nomograph = Nomograph.Parallel(name="parallel", func_vars=[0, 1, 2], funcs=["t"] * 3, ranges=[(0, 1)] * 3)
+    nomograph.scale(100, 100)
+    nomograph.execute_last_transform()
+
+    return nomograph, nomograph.compile_kernels(nomograph.base_matrix, {}), import_time
+
+
+# Runs on the worker after the first chart is compiled: compiles the default chart of a type
+# (filling the kernel caches), so selecting it later does not wait for sympy
+def warm_template(item):
+    if item["name"] not in Nomograph.chart_types:
+        return
+
+    functions = item["functions"] if item.get("variables") != -1 else [0, 1, 2]
+    chart_type = Nomograph.chart_types[item["name"]]
+    nomograph = chart_type(name=chart_type.__name__.lower(), func_vars=functions)
+    nomograph.compile_kernels(nomograph.base_matrix, {})
 
 
 class MainApp(tk.Tk):
@@ -12,10 +63,20 @@ class MainApp(tk.Tk):
 
         self.title("Nomograph Builder")
 
-        self.nomograph = Nomograph.Parallel(name="parallel", func_vars=[0, 1, 2], funcs=["t"] * 3, ranges=[(0, 1)] * 3)
+        # The window shows right away, the default chart is loaded by the worker
+        self.nomograph = None
         self.selected_tag = None
-        self.nomograph.scale(100, 100)
-        self.nomograph.execute_last_transform()
+
+        # Parsing and compiling are done on the worker, the canvas keeps the last good geometry meanwhile
+        self.worker = Worker.Worker()
+        self.worker.submit("startup", load_default_nomograph)
+        self.pending_nomograph = None
+        self.is_ready = False
+
+        # Seconds from STARTED to the window, and to the first chart drawn
+        self.window_time = None
+        self.import_time = None
+        self.first_paint_time = None
 
         self.help_win = None
         self.create_menu()
@@ -29,12 +90,37 @@ class MainApp(tk.Tk):
         self.selected_name.set(self.types[0]["name"])
         self.last_selected_name = ""
         self.status_var = tk.StringVar()
+        # Number of variables of the types that take any number of them
+        self.variable_count = tk.IntVar(value=3)
 
         self.crosshair = {"h": None, "v": None}
         self.transform_child = None
         self.is_crosshair = False
         self.crosshair_point = (0, 0)
 
+        # Transformation the canvas items are currently drawn with
+        self.drawn_matrix = None
+        # Transformation and area around the canvas the items were computed for, anything
+        # outside of it was culled
+        self.computed_matrix = None
+        self.computed_bounds = None
+        # Scales shown on the canvas by row, their items tagged "row<row>", and the labels kept for each
+        self.drawn_scales = {}
+        self.drawn_labels = {}
+        # Lookup of the scale and value under the cursor, over the last computed geometry
+        self.spatial_index = SpatialIndex.SpatialIndex()
+        # Extents of the label texts, measured once per font
+        self.font_metrics = {}
+        # Full redraw once a zoom done by scaling the canvas items settles
+        self.settle_id = None
+
+        # Redraws are coalesced into one frame at most every frame_budget seconds
+        self.frame_budget = 1 / 60
+        self.redraw_id = None
+        self.redraw_full = False
+        self.last_frame_start = 0
+        self.last_frame_time = 0
+
         # Register validation command once
         self.vcmd = (self.register(self.validate_numeric), "%P")
 
@@ -47,10 +133,15 @@ class MainApp(tk.Tk):
         # Trace selection changes
         self.selected_name.trace_add("write", self.on_select)
 
+        self.poll_worker()
+
         # Transformation States
         self.last_mouse_pos = None
         self.pan_vector = (0, 0)   # (dx, dy)
 
+        self.window_time = time.perf_counter() - STARTED
+        self.status_var.set("Loading...")
+
     def load_json(self, path):
         with open(path, "r") as file:
             data = json.load(file)
@@ -69,10 +160,20 @@ class MainApp(tk.Tk):
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.quit)
 
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+
+        view_menu = tk.Menu(menubar, tearoff=0)
+        view_menu.add_command(label="Fit to Page", command=self.fit_to_page)
+        view_menu.add_command(label="Optimize Layout", command=self.optimize_layout)
+
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="Help", command=self.help)
 
         menubar.add_cascade(label="File", menu=file_menu)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        menubar.add_cascade(label="View", menu=view_menu)
         menubar.add_cascade(label="Help", menu=help_menu)
         self.config(menu=menubar)
 
@@ -102,6 +203,19 @@ class MainApp(tk.Tk):
         )
         self.dropdown.pack(side="left", padx=10)
 
+        # Number of variables, only used by the types that take any number of them
+        ttk.Label(top_frame, text="N =").pack(side="left")
+        self.count_spinbox = ttk.Spinbox(
+            top_frame,
+            from_=3,
+            to=12,
+            width=4,
+            textvariable=self.variable_count,
+            state="readonly",
+            command=self.on_count_changed
+        )
+        self.count_spinbox.pack(side="left", padx=(0, 10))
+
         # Description label
         self.description_label = tk.Label(
             top_frame,
@@ -149,9 +263,13 @@ class MainApp(tk.Tk):
         self.canvas.bind("<Control-Button-1>", self.on_mouse_ctrl_press)
 
         self.canvas.bind("<Motion>", self.draw_crosshair)
+        self.canvas.bind("<Motion>", self.on_mouse_motion, add="+")
 
         self.bind("r", self.on_r_pressed)
         self.bind("R", self.on_r_pressed)
+        self.bind("<Control-z>", self.undo)
+        self.bind("<Control-y>", self.redo)
+        self.bind("<Control-Z>", self.redo)
 
         # Display status bar
         self.status_var.set("")
@@ -177,23 +295,41 @@ class MainApp(tk.Tk):
         item = self.type_lookup[name]
         # Update description
         self.description_label.config(text=item["description"])
-        # Rebuild entries
-        self.build_entries(item["functions"])
 
-        # Get a new nomograph
-        if name == "Parallel":
-            self.nomograph = Nomograph.Parallel(name="parallel", func_vars=item["functions"], other=self.nomograph)
-        elif name == "N or Z":
-            self.nomograph = Nomograph.Z_Chart(name="z_chart", func_vars=item["functions"], other=self.nomograph)
-        elif name == "Concurrent":
-            self.nomograph = Nomograph.Concurrent(name="concurrent", func_vars=item["functions"], other=self.nomograph)
+        # A type with "variables": -1 takes as many variables as chosen
+        functions = item["functions"]
+        if item.get("variables") == -1:
+            functions = list(range(self.variable_count.get()))
+
+        # Rebuild entries
+        self.build_entries(functions)
+        self.selected_functions = functions
 
-        self.update_canvas()
+        # Until the default chart is loaded, the chart is selected once it is
+        if self.nomograph is not None:
+            self.select_chart(name, functions)
 
         # Auto-resize window
         self.update_idletasks()
         self.child.geometry("")
 
+    def select_chart(self, name, functions):
+        # Get a new nomograph, it replaces the current one once its kernels are compiled
+        if name in Nomograph.chart_types:
+            chart_type = Nomograph.chart_types[name]
+            nomograph = chart_type(name=chart_type.__name__.lower(), func_vars=functions, other=self.nomograph)
+            self.show_funcs(nomograph)
+
+            self.pending_nomograph = nomograph
+            self.worker.submit("select", nomograph.compile_kernels, nomograph.base_matrix, {})
+
+    def on_count_changed(self):
+        # Rebuilds the current type with the new number of variables if it takes any number of them
+        name = self.selected_name.get()
+        if self.type_lookup.get(name, {}).get("variables") == -1:
+            self.last_selected_name = ""
+            self.on_select()
+
     def validate_numeric(self, value_if_allowed):
         """
         Allow only empty input or numeric values.
@@ -262,14 +398,33 @@ class MainApp(tk.Tk):
 
                 temp_entries.append(temp_entry)
 
+            log_var = tk.BooleanVar(value=False)
+            ttk.Checkbutton(
+                row,
+                text="Log",
+                variable=log_var,
+                command=lambda row=var: self.update_log(row)
+            ).pack(side="left", padx=(0, 10))
+
             self.ranges.append({
                 "min": temp_entries[0],
                 "max": temp_entries[1],
                 "maj": temp_entries[2],
-                "minor": temp_entries[3]
+                "minor": temp_entries[3],
+                "log": log_var
             })
 
+    # Shows the functions of a nomograph in the entries, the ones kept from the previous type may
+    # not be what it took from it
+    def show_funcs(self, nomograph):
+        for entry, func in zip(self.entries, nomograph.funcs):
+            entry.delete(0, tk.END)
+            entry.insert(0, str(func))
+
     def update_ranges(self, event):
+        if self.nomograph is None:
+            return
+
         # Updates a range, then updates the canvas
         widget = event.widget
 
@@ -295,7 +450,22 @@ class MainApp(tk.Tk):
         widget.delete(0, tk.END)
         widget.insert(0, f"{new_val}")
 
-        self.update_canvas()
+        self.schedule_redraw(full=True)
+
+    def update_log(self, row):
+        # Switches a range between linear and log, then shows the values it was moved to
+        if self.nomograph is None:
+            return
+
+        ticks = self.nomograph.get_tick(row)
+        ticks.set_log(self.ranges[row]["log"].get())
+
+        values = {"min": ticks.min, "max": ticks.max, "maj": ticks.maj_tick, "minor": ticks.min_tick}
+        for name, value in values.items():
+            self.ranges[row][name].delete(0, tk.END)
+            self.ranges[row][name].insert(0, f"{value}")
+
+        self.schedule_redraw(full=True)
 
     def get_funcs(self):
         funcs = [entry["main"].get() for entry in self.entries]
@@ -303,19 +473,209 @@ class MainApp(tk.Tk):
         return funcs
 
     def update_formulas(self, event):
-        # Updates a range, then updates the canvas
+        # Sends a formula to be parsed and compiled, the canvas is updated once it is done
         widget = event.widget
+        if self.nomograph is None:
+            return
 
+        nomograph = self.nomograph
         for row, entry_group in enumerate(self.entries):
             if widget is entry_group:
-                self.nomograph.update_formula(row, widget.get())
+                self.worker.submit(
+                    ("formula", nomograph, row),
+                    nomograph.compile_formula, row, widget.get(), nomograph.funcs[:], dict(nomograph.kernels)
+                )
 
-        self.update_canvas()
+    def poll_worker(self):
+        # Applies the results of the worker, the ones superseded by a later request are already dropped
+        # Polls again whatever happens, so one failure cannot stop applying the next results
+        try:
+            for key, result, error in self.worker.poll():
+                try:
+                    if error is not None:
+                        self.on_job_error(key, error)
+                    else:
+                        self.apply_result(key, result)
+                except Exception as exception:
+                    self.status_var.set(f"Error: {exception}")
+        finally:
+            self.after(20, self.poll_worker)
+
+    def on_job_error(self, key, error):
+        if key == "startup":
+            self.status_var.set(f"Could not load the chart: {error}")
+
+        elif key == "select":
+            self.pending_nomograph = None
+            self.status_var.set(f"Could not compile the chart: {error}")
+
+        elif key[0] == "warm":
+            # Only compiles ahead of time, the template is compiled again when selected
+            pass
+
+        elif key[0] == "layout":
+            self.status_var.set(f"Could not optimize the layout: {error}")
 
+        else:
+            self.status_var.set(f"Invalid formula: {error}")
+
+    def apply_result(self, key, result):
+        if key == "startup":
+            self.nomograph, kernels, self.import_time = result
+            self.nomograph.set_kernels(kernels)
+            self.select_chart(self.last_selected_name, self.selected_functions)
+
+            # Then every template, after the selected chart as the worker runs them in order
+            for item in self.types:
+                self.worker.submit(("warm", item["name"]), warm_template, item)
+
+        elif key == "select":
+            nomograph = self.pending_nomograph
+            self.pending_nomograph = None
+
+            # Catch up with what was done to the current nomograph while compiling
+            nomograph.copy(self.nomograph)
+            nomograph.set_kernels(result)
+            self.nomograph = nomograph
+            self.show_funcs(nomograph)
+            self.is_ready = True
+            self.schedule_redraw(full=True)
+
+        elif key[0] == "warm":
+            pass
+
+        elif key[0] == "layout":
+            if key[1] is self.nomograph:
+                matrix, score = result
+                Layout.apply(self.nomograph, matrix)
+                self.status_var.set(f"Layout score: {score:.3f}")
+                self.schedule_redraw(full=True)
+
+        elif key[1] is self.nomograph:
+            expr, kernels = result
+            self.nomograph.update_formula(key[2], expr)
+            self.nomograph.set_kernels(kernels)
+            self.schedule_redraw(full=True)
+
+    @Trace.traced("update_canvas")
     def update_canvas(self):
-        self.canvas.delete("nomograph")
+        if self.settle_id is not None:
+            self.after_cancel(self.settle_id)
+            self.settle_id = None
+
+        # Nothing to show until the first nomograph is compiled
+        if not self.is_ready:
+            return
+
+        self.nomograph.transform()
+
+        # The items of the unchanged scales are kept if they are still where they were computed,
+        # i.e. not moved by a pan or zoom since
+        if self.drawn_matrix is None or not np.array_equal(self.drawn_matrix, self.nomograph.current_matrix):
+            self.canvas.delete("nomograph")
+            self.drawn_scales.clear()
+            self.drawn_labels.clear()
+
+        # Keep a screen of margin on every side, so panning can move the items for a while
+        width, height = max(self.canvas_width, 1), max(self.canvas_height, 1)
+        self.computed_bounds = (-width, -height, 2*width, 2*height)
+        self.computed_matrix = self.nomograph.current_matrix.copy()
+
+        with Trace.span("draw_list"):
+            draw_list = self.nomograph.get_draw_list(5, viewport=self.computed_bounds)
+        self.render(draw_list)
+        self.spatial_index.update(draw_list, self.nomograph.current_matrix)
+
+        self.drawn_matrix = self.nomograph.current_matrix.copy()
+
+        if self.first_paint_time is None:
+            self.first_paint_time = time.perf_counter() - STARTED
+            self.status_var.set(
+                f"Window in {self.window_time:.2f} s, sympy imported in {self.import_time:.2f} s, "
+                f"first chart in {self.first_paint_time:.2f} s"
+            )
+            Trace.count("startup_first_paint_ms", round(self.first_paint_time * 1000))
+
+    @Trace.traced("refresh_canvas")
+    def refresh_canvas(self):
+        # Moves the existing items in place if the nomograph was only panned or zoomed,
+        # otherwise recomputes everything
+        # Nothing to show until the first nomograph is compiled, e.g. a click during the startup
+        if not self.is_ready:
+            return
+
         self.nomograph.transform()
-        self.nomograph.draw(self.gui_draw_line, self.gui_draw_text, 5)
+        if self.drawn_matrix is None:
+            self.update_canvas()
+            return
+
+        delta = Nomograph.scale_translation(self.drawn_matrix, self.nomograph.current_matrix)
+        if delta is None:
+            self.update_canvas()
+            return
+
+        # The canvas must still only show what was computed, the rest was culled
+        if not self.is_within_computed():
+            self.update_canvas()
+            return
+
+        sx, sy, tx, ty = delta
+        if not (np.isclose(sx, 1) and np.isclose(sy, 1)):
+            self.canvas.scale("nomograph", 0, 0, sx, sy)
+
+            # Scaling also stretches the ticks and label offsets, so redraw them once the zoom stops
+            if self.settle_id is not None:
+                self.after_cancel(self.settle_id)
+            self.settle_id = self.after(250, self.on_zoom_settled)
+
+        if tx != 0 or ty != 0:
+            self.canvas.move("nomograph", tx, ty)
+
+        self.drawn_matrix = self.nomograph.current_matrix.copy()
+
+    # Whether the canvas, moved back to where the items were computed, is within the computed bounds
+    def is_within_computed(self):
+        delta = Nomograph.scale_translation(self.computed_matrix, self.nomograph.current_matrix)
+        if delta is None:
+            return False
+
+        sx, sy, tx, ty = delta
+        x_min, x_max = sorted(((0 - tx) / sx, (self.canvas_width - tx) / sx))
+        y_min, y_max = sorted(((0 - ty) / sy, (self.canvas_height - ty) / sy))
+        bounds = self.computed_bounds
+
+        return x_min >= bounds[0] and y_min >= bounds[1] and x_max <= bounds[2] and y_max <= bounds[3]
+
+    def on_zoom_settled(self):
+        self.settle_id = None
+        self.schedule_redraw(full=True)
+
+    def schedule_redraw(self, full=False):
+        # Marks the canvas as dirty, all the requests until the next frame are drawn at once
+        self.redraw_full = self.redraw_full or full
+        if self.redraw_id is not None:
+            return
+
+        # Leave at least as much time as the last frame took for the events in between,
+        # so slow frames cannot pile up behind the input
+        wait = self.last_frame_start + max(self.frame_budget, self.last_frame_time) - time.perf_counter()
+        if wait <= 0:
+            self.redraw_id = self.after_idle(self.redraw)
+        else:
+            self.redraw_id = self.after(int(wait * 1000) + 1, self.redraw)
+
+    def redraw(self):
+        # Draws the latest state, whatever happened since the frame was scheduled
+        self.redraw_id = None
+        self.last_frame_start = time.perf_counter()
+
+        if self.redraw_full:
+            self.redraw_full = False
+            self.update_canvas()
+        else:
+            self.refresh_canvas()
+
+        self.last_frame_time = time.perf_counter() - self.last_frame_start
 
      # ---------- Canvas ----------
     def on_canvas_resize(self, event):
@@ -333,28 +693,69 @@ class MainApp(tk.Tk):
         #     fill="black"
         # )
 
-        self.update_canvas()
+        self.schedule_redraw(full=True)
 
-    def gui_draw_line(self, tag, points):
-        # Blue for line, red for big tick, green for small tick
-        if tag == self.selected_tag:
-            color = "blue"
-        else:
-            color = "black"
-        self.canvas.create_line(points, fill=color, width=1, smooth=True, tags=(tag, "nomograph"))
+    # Creates the canvas items of a draw list in bulk
+    @Trace.traced("render")
+    def render(self, draw_list):
+        # Only the scales whose geometry changed are replaced, the others are the same objects as before
+        scales = {scale.row: scale for scale in draw_list.scales}
+        changed = [row for row, scale in scales.items() if self.drawn_scales.get(row) is not scale]
 
-    def gui_draw_text(self, tag, px, py, text):
-        if tag == self.selected_tag:
+        for row in list(self.drawn_scales):
+            if row not in scales or row in changed:
+                self.canvas.delete(f"row{row}")
+                del self.drawn_scales[row]
+                self.drawn_labels.pop(row, None)
+
+        if not changed:
+            return
+
+        # Blue for the selected nomograph, black otherwise
+        if draw_list.name == self.selected_tag:
             color = "blue"
         else:
             color = "black"
-        self.canvas.create_text(
-            px, py,
-            text=text,
-            font=("Arial", 8),
-            fill=color,
-            tags=(tag, "nomograph")
-        )
+
+        # Nudge or drop the labels overlapping the ones placed before them, the ones of the kept
+        # scales included
+        label_font = ("Arial", 8)
+        placer = Labels.LabelPlacer(self.get_font_metrics(label_font))
+        for positions, texts in self.drawn_labels.values():
+            placer.add_labels(positions, texts)
+
+        create_line = self.canvas.create_line
+        create_text = self.canvas.create_text
+        created = 0
+        for row in changed:
+            scale = scales[row]
+            tags = (draw_list.name, "nomograph", f"row{row}")
+
+            for curve in scale.curves:
+                create_line(curve.ravel().tolist(), fill=color, width=1, smooth=True, tags=tags)
+
+            for segment in scale.ticks.reshape(-1, 4).tolist():
+                create_line(segment, fill=color, width=1, tags=tags)
+
+            with Trace.span("place_labels"):
+                labels, keep = placer.place(scale.labels, scale.texts, scale.label_normals)
+
+            texts = [text for text, is_kept in zip(scale.texts, keep) if is_kept]
+            for (px, py), text in zip(labels[keep].tolist(), texts):
+                create_text(px, py, text=text, font=label_font, fill=color, tags=tags)
+
+            self.drawn_scales[row] = scale
+            self.drawn_labels[row] = (labels[keep], texts)
+            created += len(scale.curves) + len(scale.ticks) + len(texts)
+
+        Trace.count("items_created", created)
+
+    def get_font_metrics(self, label_font):
+        if label_font not in self.font_metrics:
+            measured = tkfont.Font(font=label_font)
+            self.font_metrics[label_font] = Labels.FontMetrics(measured.measure, measured.metrics("linespace"))
+
+        return self.font_metrics[label_font]
 
     def on_mouse_press(self, event):
         self.last_mouse_pos = (event.x, event.y)
@@ -364,11 +765,14 @@ class MainApp(tk.Tk):
             self.crosshair_point = (event.x, event.y)
             self.is_crosshair = False
 
-        self.update_canvas()
+        self.schedule_redraw()
 
     def on_mouse_release(self, event):
+        if self.nomograph is None:
+            return
+
         self.nomograph.execute_last_transform()
-        self.update_canvas()
+        self.schedule_redraw()
 
     def on_mouse_ctrl_press(self, event):
         clicked_item = self.canvas.find_withtag("current")
@@ -396,6 +800,9 @@ class MainApp(tk.Tk):
         self.status_var.set(f"Clicked item ID: {item_id}, Tags: {tags}, Selected: {self.selected_tag}")
 
     def on_mouse_drag(self, event):
+        if self.nomograph is None:
+            return
+
         x0, y0 = self.last_mouse_pos
         pan_vector = (event.x - x0, event.y - y0)
         px, py = pan_vector
@@ -403,7 +810,7 @@ class MainApp(tk.Tk):
         self.nomograph.translate(px, py)
         self.nomograph.transform()
 
-        self.update_canvas()
+        self.schedule_redraw()
 
     def draw_crosshair(self, event):
         if self.is_crosshair:
@@ -415,7 +822,28 @@ class MainApp(tk.Tk):
             self.canvas.create_line(x - size, y, x + size, y, fill="red", tags="crosshair")
             self.canvas.create_line(x, y - size, x, y + size, fill="red", tags="crosshair")
 
+    def on_mouse_motion(self, event):
+        # Live readout of the value of the scale under the cursor
+        if not self.is_ready:
+            return
+
+        self.nomograph.transform()
+        hit = self.spatial_index.nearest(event.x, event.y, self.nomograph.current_matrix)
+        if hit is None:
+            return
+
+        row, t, _ = hit
+        variable = self.nomograph.row_variables[row]
+        if variable is None:
+            return
+
+        t = float(self.nomograph.closest_t(row, t, event.x, event.y))
+        self.status_var.set(f"u{variable} = {t:.6g}")
+
     def on_r_pressed(self, event):
+        if self.nomograph is None:
+            return
+
         self.nomograph.execute_last_transform()
 
         # Start tracking mouse for crosshair
@@ -459,12 +887,12 @@ class MainApp(tk.Tk):
     def on_rotate_cancel(self, event=None):
         self.nomograph.cancel_transform()
         self.on_rotate_close()
-        self.update_canvas()
+        self.schedule_redraw()
 
     def on_rotate_apply(self, event=None):
         self.nomograph.execute_last_transform()
         self.on_rotate_close()
-        self.update_canvas()
+        self.schedule_redraw()
 
     def on_rotate_changed(self, *args):
         self.angle_var.set(round(self.angle_var.get(), 2))
@@ -472,7 +900,7 @@ class MainApp(tk.Tk):
         self.nomograph.rotate_point(px, py, deg=self.angle_var.get())
         self.nomograph.transform()
 
-        self.update_canvas()
+        self.schedule_redraw()
 
     def on_rotate_close(self):
         if self.transform_child and self.transform_child.winfo_exists():
@@ -487,6 +915,9 @@ class MainApp(tk.Tk):
     # --------------------
 
     def on_mouse_wheel(self, event):
+        if self.nomograph is None:
+            return
+
         # Zoom direction
         scale = 1.1 if event.delta > 0 else 0.9
 
@@ -506,9 +937,41 @@ class MainApp(tk.Tk):
         self.nomograph.scale_at_point(sx, sy, event.x, event.y)
 
         self.nomograph.execute_last_transform()
-        self.update_canvas()
+        self.schedule_redraw()
 
     # ---------- Menu Actions ----------
+    def undo(self, event=None):
+        # Only the transformation changes, the canvas items are moved if it was a pan or zoom
+        if self.nomograph is not None and self.nomograph.undo_transform():
+            self.schedule_redraw()
+
+    def redo(self, event=None):
+        if self.nomograph is not None and self.nomograph.redo_transform():
+            self.schedule_redraw()
+
+    def fit_to_page(self):
+        # Rotates and scales the whole chart (not only what is visible) to fill the canvas
+        if not self.is_ready:
+            return
+
+        points = Bounding.get_draw_list_points(self.nomograph.get_draw_list(5, cache=False))
+        matrix = Bounding.fit_matrices([Bounding.convex_hull(points)], (self.canvas_width, self.canvas_height))[0]
+
+        self.nomograph.set_transform(matrix)
+        self.nomograph.execute_last_transform()
+        self.schedule_redraw(full=True)
+
+    def optimize_layout(self):
+        # Samples the rows here, the search runs on the worker and is applied once it is done
+        if not self.is_ready:
+            return
+
+        points, graduated = Layout.get_samples(self.nomograph)
+        page = (max(self.canvas_width, 1), max(self.canvas_height, 1))
+        # On this process, forking the worker processes from a thread of Tk is not safe
+        self.worker.submit(("layout", self.nomograph), functools.partial(Layout.search, workers=1), points, graduated, page)
+        self.status_var.set("Optimizing layout...")
+
     def new_file(self):
         # TODO
         # messagebox.showinfo("New", "New document created.")
@@ -540,9 +1003,20 @@ class MainApp(tk.Tk):
         pass
 
     def print(self):
-        # TODO
-        # Deal with printing to a pdf
-        pass
+        # Exports the nomograph as vector graphics, streamed to the file
+        if not self.is_ready:
+            return
+
+        path = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            filetypes=[("PDF Files", "*.pdf"), ("SVG Files", "*.svg")]
+        )
+        if not path:
+            return
+
+        self.nomograph.transform()
+        Export.export(self.nomograph, path, tick_size=5)
+        self.status_var.set(f"Exported to {path}")
 
     def help(self):
         if self.help_win is not None and self.help_win.winfo_exists():
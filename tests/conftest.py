@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Application"))
+import KernelCache
+
+
+# Compiled kernels go to a temporary cache, never to the cache of the user
+@pytest.fixture(autouse=True)
+def kernel_cache(tmp_path):
+    with KernelCache.use(KernelCache.KernelCache(str(tmp_path / "kernels"))) as cache:
+        yield cache
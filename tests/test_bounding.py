@@ -0,0 +1,126 @@
+import numpy as np
+
+import Bounding
+
+
+# Convex hull by the monotone chain, as counter-clockwise vertices without the collinear points
+def reference_hull(points):
+    points = sorted(set(map(tuple, points)))
+
+    def cross(o, a, b):
+        return (a[0] - o[0])*(b[1] - o[1]) - (a[1] - o[1])*(b[0] - o[0])
+
+    lower, upper = [], []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+
+    return np.array(lower[:-1] + upper[:-1])
+
+
+# Smallest area of the rectangles bounding a hull with a side along one of its edges
+def reference_area(hull):
+    areas = []
+    for ind in range(len(hull)):
+        edge = hull[(ind + 1) % len(hull)] - hull[ind]
+        u = edge / np.hypot(*edge)
+        v = np.array([-u[1], u[0]])
+        areas.append(np.ptp(hull @ u) * np.ptp(hull @ v))
+
+    return min(areas)
+
+
+def get_point_sets():
+    rng = np.random.default_rng(0)
+    sets = [rng.normal(size=(count, 2)) * rng.uniform(0.1, 10, 2) for count in (3, 10, 100, 1000)]
+    angles = np.linspace(0, 6, 500)
+    sets.append(np.stack((np.cos(angles), np.sin(angles)), axis=1))
+    # A square with points on its sides
+    sets.append(np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0.5, 0], [0.5, 0.5]], dtype=float))
+
+    return sets
+
+
+def test_convex_hulls():
+    sets = get_point_sets()
+    for points, hull in zip(sets, Bounding.convex_hulls(sets)):
+        assert set(map(tuple, hull)) == set(map(tuple, reference_hull(points)))
+
+        # Counter-clockwise
+        assert np.sum(hull[:, 0]*np.roll(hull[:, 1], -1) - np.roll(hull[:, 0], -1)*hull[:, 1]) > 0
+
+
+def test_degenerate_hulls():
+    sets = [np.array([[0, 0], [1, 1], [2, 2]], dtype=float), np.array([[1, 1]], dtype=float), np.empty((0, 2))]
+    counts = [len(hull) for hull in Bounding.convex_hulls(sets)]
+    assert counts == [2, 1, 0]
+
+    areas = Bounding.min_area_rectangles(Bounding.convex_hulls(sets))[2]
+    assert np.isclose(areas[0], 0) and np.isnan(areas[1:]).all()
+
+
+def test_min_area_rectangles():
+    sets = get_point_sets()
+    hulls = Bounding.convex_hulls(sets)
+    corners, angles, areas = Bounding.min_area_rectangles(hulls)
+
+    for points, hull, rectangle, area in zip(sets, hulls, corners, areas):
+        assert np.isclose(area, reference_area(hull))
+
+        # Every point is in the rectangle
+        u, v = rectangle[1] - rectangle[0], rectangle[3] - rectangle[0]
+        along_u = (points - rectangle[0]) @ u / (u @ u)
+        along_v = (points - rectangle[0]) @ v / (v @ v)
+        assert along_u.min() > -1e-9 and along_u.max() < 1 + 1e-9
+        assert along_v.min() > -1e-9 and along_v.max() < 1 + 1e-9
+
+
+def test_fit_matrices():
+    page, margin = (800, 600), 20
+    sets = get_point_sets()
+
+    for points, matrix in zip(sets, Bounding.fit_matrices(Bounding.convex_hulls(sets), page, margin)):
+        fitted = np.column_stack((points, np.ones(len(points)))) @ matrix
+        low, high = fitted[:, :2].min(axis=0), fitted[:, :2].max(axis=0)
+
+        # Inside the margin, touching it on one side at least
+        assert (low > margin - 1e-6).all() and (high < np.array(page) - margin + 1e-6).all()
+        assert np.isclose(low, margin).any() or np.isclose(high, np.array(page) - margin).any()
+
+
+def test_collinear_and_duplicate_points():
+    sets = [
+        # Farthest points tied on a line parallel to the first edge, one of them twice
+        np.array([[0, 0], [4, 0], [1, 2], [2, 2], [3, 2], [2, 2]], dtype=float),
+        # Every point of a square many times
+        np.tile(np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0.5, 1]]), (5, 1)),
+        # Collinear points, not along an axis
+        np.array([[3, 0], [-2, 1], [0.5, 0.5], [3, 0]], dtype=float)
+    ]
+
+    hulls = Bounding.convex_hulls(sets)
+    assert [len(hull) for hull in hulls] == [4, 4, 2]
+    for points, hull in zip(sets[:2], hulls):
+        assert set(map(tuple, hull)) == set(map(tuple, reference_hull(points)))
+
+
+def test_fit_segments():
+    page, margin = (800, 600), 20
+    segments = [
+        np.array([[3, 0], [-2, 1]], dtype=float),
+        np.array([[0, 0], [5, 0]], dtype=float),
+        np.array([[0, 0], [0, 5], [0, 2]], dtype=float),
+        np.array([[1, 1], [2, 2], [3, 3]], dtype=float)
+    ]
+
+    for points, matrix in zip(segments, Bounding.fit_matrices(Bounding.convex_hulls(segments), page, margin)):
+        fitted = np.column_stack((points, np.ones(len(points)))) @ matrix
+
+        # Along the width of the page, across its middle
+        assert np.allclose(np.sort(fitted[:, 0])[[0, -1]], [margin, page[0] - margin])
+        assert np.allclose(fitted[:, 1], page[1] / 2)
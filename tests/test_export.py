@@ -0,0 +1,41 @@
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+import pytest
+
+import Export
+import Nomograph
+
+
+def get_scale(points):
+    points = np.array(points, dtype=float)
+    ticks = np.stack((points, points + 5), axis=1)
+    labels = points + 10
+
+    return Nomograph.ScaleGeometry(
+        0, [points], [np.arange(len(points), dtype=float)], ticks, np.ones(len(ticks), dtype=bool),
+        labels, [f"{ind}" for ind in range(len(labels))]
+    )
+
+
+@pytest.mark.parametrize("points", [
+    [[0, 0], [100, 50]],
+    # Near a pole of the projective transformation
+    [[-1.234567e11, 3e11], [2.5e11, -9.87e11]],
+    # Next to the largest floats, the width overflowing to infinity
+    [[-1.7e308, -1.7e308], [1.7e308, 1.7e308]],
+    [[0, 0], [1.79e308, -1.79e308]]
+])
+def test_svg_view_box(tmp_path, points):
+    path = str(tmp_path / "scale.svg")
+    with Export.SvgWriter(path) as writer:
+        writer.write_scale(get_scale(points))
+
+    svg = ElementTree.parse(path).getroot()
+    view_box = [float(value) for value in svg.get("viewBox").split()]
+    assert len(view_box) == 4 and np.isfinite(view_box).all()
+    assert float(svg.get("width")) == view_box[2] and float(svg.get("height")) == view_box[3]
+
+    # The elements after the view box are all there
+    assert len(svg.findall(".//{http://www.w3.org/2000/svg}polyline")) == 1
+    assert len(svg.findall(".//{http://www.w3.org/2000/svg}text")) == len(points)
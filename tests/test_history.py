@@ -0,0 +1,77 @@
+import numpy as np
+
+import History
+
+
+# Random rotations with translations, every eighth step absolute
+def random_steps(rng, count):
+    steps = []
+    for ind in range(count):
+        if ind % 8 == 5:
+            steps.append((np.diag([rng.uniform(0.5, 2), rng.uniform(0.5, 2), 1]), True))
+            continue
+
+        angle = rng.normal()
+        steps.append((np.array([
+            [np.cos(angle),     -np.sin(angle),     0],
+            [np.sin(angle),     np.cos(angle),      0],
+            [rng.normal(),      rng.normal(),       1]
+        ]), False))
+
+    return steps
+
+
+def test_history_matches_composition():
+    rng = np.random.default_rng(0)
+    history = History.TransformHistory(checkpoint_interval=8)
+
+    expected = [np.identity(3)]
+    for step, is_absolute in random_steps(rng, 100):
+        history.push(step, is_absolute)
+        expected.append(step if is_absolute else expected[-1] @ step)
+
+    for position in rng.permutation(101):
+        assert np.allclose(history.seek(position), expected[position])
+
+    history.seek(100)
+    for position in range(99, -1, -1):
+        assert np.allclose(history.undo(), expected[position])
+    assert history.undo() is None
+
+    for position in range(1, 101):
+        assert np.allclose(history.redo(), expected[position])
+    assert history.redo() is None
+
+    # Pushing after undoing drops the steps that were undone
+    history.seek(50)
+    history.push(np.identity(3))
+    assert history.count == 51 and not history.can_redo()
+    assert np.allclose(history.matrix, expected[50])
+
+
+def test_history_drops_oldest_steps():
+    rng = np.random.default_rng(1)
+    history = History.TransformHistory(checkpoint_interval=4, max_steps=16)
+
+    expected = [np.identity(3)]
+    for step, is_absolute in random_steps(rng, 100):
+        history.push(step, is_absolute)
+        expected.append(step if is_absolute else expected[-1] @ step)
+
+    assert history.count <= 16 + 16 // 4
+    assert np.allclose(history.matrix, expected[-1])
+    for offset in range(history.count + 1):
+        assert np.allclose(history.seek(history.count - offset), expected[-1 - offset])
+
+
+def test_renormalize_keeps_similarities():
+    angle = 2 * np.pi / 7
+    rotation = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [3, 4, 1]])
+    drifted = 2 * rotation @ np.diag([1 + 1e-12, 1, 1])
+
+    matrix = History.renormalize(drifted)
+    singular = np.linalg.svd(matrix[:2, :2])[1]
+    assert matrix[2, 2] == 1 and singular[0] == singular[1]
+
+    shear = np.array([[1, 0.5, 0], [0, 1, 0], [0, 0, 2]])
+    assert np.allclose(History.renormalize(shear), shear / 2)
@@ -0,0 +1,24 @@
+import numpy as np
+
+import Nomograph
+
+
+def test_solve_parallel():
+    nomograph = Nomograph.Parallel(name="parallel", func_vars=[0, 1, 2], ranges=[(0, 1), (0, 1), (0, 2)])
+
+    rng = np.random.default_rng(0)
+    u0, u1 = rng.uniform(0, 1, 1000), rng.uniform(0, 1, 1000)
+    assert np.allclose(nomograph.solve(2, {0: u0, 1: u1}), u0 + u1)
+    assert np.allclose(nomograph.solve(0, {1: u1, 2: u0 + u1}), u0)
+
+    # On an end of the range, and outside of it
+    assert nomograph.solve(2, {0: np.array([0.0]), 1: np.array([0.0])})[0] == 0
+    assert np.isnan(nomograph.solve(0, {1: np.array([0.5]), 2: np.array([2.0])})).all()
+
+
+def test_solve_nonlinear():
+    nomograph = Nomograph.Z_Chart(name="z", func_vars=[0, 1, 2], funcs=["t", "t**2", "t"], ranges=[(0, 4), (0.1, 2), (0, 1)])
+
+    rng = np.random.default_rng(0)
+    u1, u2 = rng.uniform(0.1, 2, 100), rng.uniform(0, 1, 100)
+    assert np.allclose(nomograph.solve(0, {1: u1, 2: u2}), u1**2 * u2)